@@ -1,32 +1,59 @@
 import logging
-logging.basicConfig(level=logging.DEBUG)
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g, Response, send_file, abort, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import random
-import time
 import os
 import json
+import time
+import uuid
+
+import metrics
+import tmdb_client
+from tmdb_cache import cache as tmdb_cache, ResponseCache, ENDPOINT_TTLS
+from tmdb_scheduler import scheduler as tmdb_scheduler, INTERACTIVE, BACKGROUND
+from catalog import catalog
+from calendar_store import precomputed_calendars
+from jobs import JobQueue, QueueFull, DONE
+from reservoir import CandidateReservoir, ReservoirStore
+from singleflight import SingleFlight, StreamFlight
+from keyword_registry import KeywordRegistry
+from poster_store import posters, PosterNotFound, PosterTimeout, PosterUnavailable
+from identity_cache import identities, CachedUser
+from log_config import setup_logging
+import storage_profile
+
+setup_logging()
+log = logging.getLogger(__name__)
 
 app = Flask(__name__)
-logging.info("Flask app created")
+log.info("Flask app created")
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///movie_advent.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///movie_advent.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = storage_profile.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+storage_profile.install()
 
 db = SQLAlchemy(app)
-logging.info("Database initialized")
+log.info("Database initialized")
+
+def _dispose_pool_after_fork():
+    # Pooled connections opened before a gunicorn --preload fork belong to the master; start afresh
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_pool_after_fork)
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-API_KEY = os.environ.get('TMDB_API_KEY', '0583fddd4f95815a08d57376fe8bd414')
-
 MONTH_THEME_MAP = {
     1: "Winter", 2: "Winter", 3: "Spring", 4: "Spring", 5: "Spring",
     6: "Summer", 7: "Summer", 8: "Summer", 9: "Autumn", 10: "Halloween",
@@ -43,8 +70,64 @@ THEME_GENRE_MAP = {
     "Movies": None
 }
 
+# "Movies" is the general theme and never searches by keyword
+KEYWORD_THEMES = list(MONTH_THEME_MAP.values()) + [t for t in THEME_GENRE_MAP if t != "Movies"]
+keyword_registry = KeywordRegistry(KEYWORD_THEMES)
+
+# Discover pages fetched concurrently per round trip when building a calendar
+DISCOVER_BATCH_SIZE = int(os.environ.get('DISCOVER_BATCH_SIZE', 5))
+discover_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('DISCOVER_WORKERS', 16)))
+# "random": sample distinct pages across the whole result set; "crawl": walk forward from page 1
+DISCOVER_SAMPLING = os.environ.get('DISCOVER_SAMPLING', 'random')
+# Pages in the first sampling round; later rounds fetch DISCOVER_BATCH_SIZE more
+DISCOVER_SAMPLE_PAGES = int(os.environ.get('DISCOVER_SAMPLE_PAGES', 4))
+# Catalog rows, most popular first, a sampled calendar is drawn from; about the 50 pages discover sampling covers
+CATALOG_SAMPLE_POOL = int(os.environ.get('CATALOG_SAMPLE_POOL', 1000))
+
+# Replacement candidates per (session, filter set), seeded from the calendar crawl
+replacement_reservoirs = ReservoirStore()
+RESERVOIR_SEED_SIZE = 40
+
+# Concurrent identical calendar requests share one upstream crawl
+calendar_flights = SingleFlight()
+# The same for streamed calendars: requests that join get every batch the crawl has produced so far
+calendar_stream_flights = StreamFlight()
+
+# State every worker process must see, e.g. background job status when gunicorn runs several workers
+SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH', os.path.join(app.instance_path, 'shared_state.db'))
+shared_state = ResponseCache(SHARED_STATE_PATH, max_entries=5000)
+# Each gunicorn worker's counters and histograms, so /metrics can report all of them (started in post_fork)
+METRICS_PATH = os.environ.get('METRICS_PATH', os.path.join(app.instance_path, 'metrics.db'))
+shared_metrics = metrics.SharedMetrics(METRICS_PATH, metrics.registry)
+
+# Long calendar builds can run in the background; clients poll or follow the job's events
+calendar_jobs = JobQueue(shared=shared_state)
+JOB_EVENTS_KEEPALIVE = 15  # seconds between SSE comments while a job is quiet
+
+# Opt-in streamed calendars (request "stream" field or Accept header) -> response mimetype
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+# Set to make sort choices and shuffles a pure function of the request, e.g. for cassette replays
+RANDOM_SEED = os.environ.get('RANDOM_SEED')
+
+# Movie details change rarely; let browsers keep them for an hour then revalidate
+DETAILS_CACHE_CONTROL = "public, max-age=3600"
+MAX_DETAILS_BATCH = 50
+
+# Poster URLs name TMDB's content-hashed file, so a URL's bytes never change
+POSTER_MAX_AGE = 365 * 24 * 60 * 60
+
+LISTS_PER_PAGE = 10
+
+# Werkzeug hash method with its cost spelled out, e.g. pbkdf2:sha256:600000 or scrypt:32768:8:1.
+# Lower it to make login bursts cheaper; stored hashes move to it as their users next log in
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+# What hashes made with that method start with; werkzeug fills in defaults, e.g. "scrypt" -> "scrypt:32768:8:1"
+PASSWORD_HASH_PREFIX = generate_password_hash("", PASSWORD_HASH_METHOD).split('$', 1)[0]
+
 # UK streaming services including Shudder
 UK_SERVICES = [8, 9, 337, 99]
+
 UK_SERVICE_NAMES = {
     8: "Netflix",
     9: "Amazon Prime Video",
@@ -57,25 +140,114 @@ UK_SERVICE_NAMES = {
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.String(150), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # scrypt hashes run past 150
     movie_lists = db.relationship('MovieList', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, PASSWORD_HASH_METHOD)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def needs_rehash(self):
+        """True when the stored hash was made with another method or cost than PASSWORD_HASH_METHOD"""
+        return self.password_hash.split('$', 1)[0] != PASSWORD_HASH_PREFIX
+
 class MovieList(db.Model):
+    __table_args__ = (db.Index('ix_movie_list_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
-    movies = db.Column(db.Text, nullable=False)  # JSON string of movies
+    # Legacy JSON blob of movies, superseded by MovieListItem rows
+    movies = db.Column(db.Text, nullable=False, default='[]')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    items = db.relationship('MovieListItem', backref='movie_list', lazy=True,
+                            cascade='all, delete-orphan', order_by='MovieListItem.position')
+
+def poster_path_only(poster):
+    """'/abc.jpg' from either a TMDB poster path or a full image URL saved by older pages"""
+    if poster and poster.startswith('http'):
+        return '/' + poster.rsplit('/', 1)[-1]
+    return poster
+
+class MovieListItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    list_id = db.Column(db.Integer, db.ForeignKey('movie_list.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    movie_id = db.Column(db.Integer)
+    title = db.Column(db.String(300), nullable=False)
+    release_date = db.Column(db.String(20))
+    poster_path = db.Column(db.String(300))
+    providers = db.Column(db.Text, nullable=False, default='[]')  # JSON list of service names
+
+    @classmethod
+    def from_movie(cls, position, movie):
+        return cls(
+            position=position,
+            movie_id=movie.get('id'),
+            title=movie.get('title', ''),
+            release_date=movie.get('release_date'),
+            poster_path=poster_path_only(movie.get('poster_path')),
+            providers=json.dumps(movie.get('providers') or [])
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.movie_id,
+            'title': self.title,
+            'release_date': self.release_date,
+            'poster_path': poster_path_only(self.poster_path),
+            'providers': json.loads(self.providers)
+        }
+
+def migrate_legacy_lists():
+    """Move JSON blob lists into MovieListItem rows and add indexes missing from old tables"""
+    for index in MovieList.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    legacy = MovieList.query.filter(MovieList.movies != '[]').all()
+    for movie_list in legacy:
+        if not movie_list.items:
+            for position, movie in enumerate(json.loads(movie_list.movies)):
+                movie_list.items.append(MovieListItem.from_movie(position, movie))
+        movie_list.movies = '[]'
+    db.session.commit()
+    return len(legacy)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Authenticated requests are served from the identity cache; the user table is read once per TTL
+    user_id = int(user_id)
+    user = identities.get(user_id)
+    metrics.user_cache_lookups.inc(result="miss" if user is None else "hit")
+    if user is None:
+        row = db.session.get(User, user_id)
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.username)
+        identities.put(user)
+    return user
+
+def log_in(user):
+    """login_user, priming the identity cache so the user's next requests skip the user table"""
+    login_user(user)
+    identities.put(CachedUser(user.id, user.username))
+
+@db.event.listens_for(db.session, "after_flush")
+def note_changed_users(session, flush_context):
+    changed = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault("changed_users", set()).update(changed)
+
+@db.event.listens_for(db.session, "after_commit")
+def invalidate_changed_users(session):
+    # After the commit, so a request reading the old row just before can't cache it again
+    for user_id in session.info.pop("changed_users", ()):
+        identities.invalidate(user_id)
+
+@db.event.listens_for(db.session, "after_soft_rollback")
+def forget_changed_users(session, previous_transaction):
+    session.info.pop("changed_users", None)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -89,7 +261,7 @@ def register():
         user.set_password(password)
         db.session.add(user)
         db.session.commit()
-        login_user(user)
+        log_in(user)
         return redirect(url_for('index'))
     return render_template('register.html')
 
@@ -100,7 +272,10 @@ def login():
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
-            login_user(user)
+            if user.needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+            log_in(user)
             return redirect(url_for('index'))
         flash('Invalid username or password')
     return render_template('login.html')
@@ -111,75 +286,175 @@ def logout():
     logout_user()
     return redirect(url_for('index'))
 
+def seeded_random(*key):
+    """The random module, or with RANDOM_SEED set a generator seeded from the seed and key"""
+    if RANDOM_SEED is None:
+        return random
+    return random.Random(repr((RANDOM_SEED, *key)))
+
 def get_theme_keywords(theme):
-    """Fetch keyword IDs for a given theme"""
-    
-    # Special handling for Halloween with specific keywords
-    if theme == "Halloween":
-        specific_keywords = ["halloween", "slasher", "scary", "paranormal", "jumpscare", "supernatural horror", "demonic"]
-        keyword_ids = []
-        
-        for kw in specific_keywords:
-            url = f"https://api.themoviedb.org/3/search/keyword?api_key={API_KEY}&query={kw}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get("results", [])
-                if results:
-                    # Take the first (most relevant) match
-                    kid = results[0]["id"]
-                    keyword_ids.append(kid)
-                    print(f"Added Halloween keyword '{kw}' (ID: {kid})")
-                else:
-                    print(f"No keyword found for '{kw}'")
-            else:
-                print(f"Failed to fetch keyword for '{kw}': {response.text}")
-            time.sleep(0.1)  # Small delay to avoid rate limits
-        
-        print(f"Halloween keywords found: {len(keyword_ids)} IDs: {keyword_ids}")
-        return keyword_ids if keyword_ids else [616]  # 616 is a fallback Halloween keyword ID
-    
-    # For Christmas, use specific keywords too
-    elif theme == "Christmas":
-        specific_keywords = ["christmas", "holiday"]  # Using both christmas and holiday as requested
-        keyword_ids = []
-        
-        for kw in specific_keywords:
-            url = f"https://api.themoviedb.org/3/search/keyword?api_key={API_KEY}&query={kw}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get("results", [])
-                if results:
-                    kid = results[0]["id"]
-                    keyword_ids.append(kid)
-                    print(f"Added Christmas keyword '{kw}' (ID: {kid})")
-            else:
-                print(f"Failed to fetch keyword for '{kw}'")
-            time.sleep(0.1)
-        
-        print(f"Christmas keywords found: {len(keyword_ids)} IDs: {keyword_ids}")
-        return keyword_ids if keyword_ids else [207]  # 207 is a fallback Christmas keyword ID
-    
-    # For other themes, do a general keyword search
+    """Keyword IDs for a given theme, served from the precomputed registry"""
+    started = time.perf_counter()
+    keyword_ids = keyword_registry.get(theme)
+    metrics.keyword_lookup_latency.observe(time.perf_counter() - started)
+    return keyword_ids
+
+def filter_rejection(movie, category, current_year):
+    """Why the release year and category rules reject a discover result, or None if it passes"""
+    year = movie.get("release_date", "1900")[:4]
+    try:
+        year = int(year)
+    except ValueError:
+        year = 1900
+
+    if year > current_year:
+        return "future_release"
+    if category == "modern" and year < current_year - 10:
+        return "category"
+    if category == "classics" and year >= current_year - 20:
+        return "category"
+    return None
+
+
+def movie_passes_filters(movie, category, current_year):
+    """Apply the release year and category rules to a discover result"""
+    return filter_rejection(movie, category, current_year) is None
+
+
+def parse_year(value):
+    """Year from a form field, None when blank or not a number"""
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def release_year_bounds(category, year_from="", year_to="", current_year=None):
+    """First and last acceptable release year (None when unbounded below), or None when no year can match
+
+    The query planner for the year rules: the user's range, the category
+    window and the no-future-releases cutoff intersected into one range, so
+    discover only returns movies filter_rejection would keep.
+    """
+    current_year = current_year or datetime.now().year
+    year_min = parse_year(year_from)
+    year_max = min(parse_year(year_to) or current_year, current_year)
+    if category == "modern":
+        year_min = max(year_min or 0, current_year - 10)
+    if category == "classics":
+        year_max = min(year_max, current_year - 21)
+    if year_min is not None and year_min > year_max:
+        return None
+    return year_min, year_max
+
+
+def discover_params(theme, selected_services, genre=None, year_from="", year_to="", keyword_string=None, sort_by="popularity.desc", page=1, category="all"):
+    """Query parameters for /discover/movie, shared by the calendar and replacement paths"""
+    params = {
+        "language": "en-US",
+        "region": "GB",
+        "sort_by": sort_by,
+        "include_adult": "false",
+        "include_video": "false",
+        "with_watch_providers": selected_services,
+        "watch_region": "GB",
+        "page": page,
+    }
+    if theme == "Movies":
+        # General movies - use broad discover
+        params.update({"vote_count.gte": 500, "with_runtime.gte": 60, "with_original_language": "en"})
     else:
-        query = theme.lower()
-        url = f"https://api.themoviedb.org/3/search/keyword?api_key={API_KEY}&query={query}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            keywords = data.get("results", [])
-            # Take top 5-10 keywords related to the theme
-            keyword_ids = [kw["id"] for kw in keywords[:10]]
-            print(f"Fetched keywords for {theme}: {[kw['name'] for kw in keywords[:10]]}")
-            return keyword_ids
-        else:
-            print(f"Failed to fetch {theme} keywords: {response.text}")
-            return []
+        # Themed movies - use discover with keywords
+        params.update({"vote_count.gte": 100, "with_keywords": keyword_string})
+    params["with_genres"] = genre
+    bounds = release_year_bounds(category, year_from, year_to)
+    if bounds:
+        year_min, year_max = bounds
+        if year_min is not None:
+            params["primary_release_date.gte"] = f"{year_min}-01-01"
+        params["primary_release_date.lte"] = f"{year_max}-12-31"
+    return params
+
+
+def find_catalog_movies(theme, limit, category, genre, year_from, year_to, exclude_titles, selected_services, keyword_ids, rng=None):
+    """Answer a calendar query from the local catalog, None when the catalog can't
+
+    Most popular first, or with an rng and random DISCOVER_SAMPLING a random
+    sample of the CATALOG_SAMPLE_POOL most popular matches.
+    """
+    if not catalog.available() or (genre and not str(genre).isdigit()):
+        return None
+    sample = rng is not None and DISCOVER_SAMPLING == "random"
+    fetch_limit = CATALOG_SAMPLE_POOL if sample else limit + len(exclude_titles)
+
+    bounds = release_year_bounds(category, year_from, year_to)
+    if bounds is None:
+        return []
+    year_min, year_max = bounds
+
+    if theme == "Movies":
+        rows = catalog.find_movies(selected_services, None, genre, year_min, year_max,
+                                   min_votes=500, language="en", limit=fetch_limit)
+    else:
+        rows = catalog.find_movies(selected_services, keyword_ids, genre, year_min, year_max,
+                                   limit=fetch_limit)
+
+    movies = [{
+        "id": row["id"],
+        "title": row["title"],
+        "release_date": row["release_date"] or "Unknown",
+        "poster_path": row["poster_path"],
+        "vote_average": row["vote_average"],
+        "providers": [UK_SERVICE_NAMES.get(int(sid), sid) for sid in selected_services]
+    } for row in rows if row["title"] not in exclude_titles]
+    if sample:
+        return rng.sample(movies, min(limit, len(movies)))
+    return movies[:limit]
+
+
+def format_discover_movie(movie, selected_services):
+    """Calendar entry for a discover result"""
+    return {
+        "id": movie["id"],
+        "title": movie["title"],
+        "release_date": movie.get("release_date", "Unknown"),
+        "poster_path": movie.get("poster_path"),
+        "vote_average": movie.get("vote_average", 0),
+        # Movie is already filtered by streaming services in discover endpoint
+        "providers": [UK_SERVICE_NAMES.get(int(sid), sid) for sid in selected_services]
+    }
+
+
+def total_pages_key(params):
+    # The page count depends on the filters only, not on the page or the sort order
+    filters = {name: value for name, value in params.items() if name not in ("page", "sort_by")}
+    return "total_pages:" + json.dumps(filters, sort_keys=True, default=str)
+
+
+def cached_total_pages(params):
+    """Discover page count last seen for these filters, None when not known"""
+    body = tmdb_cache.get(total_pages_key(params))
+    return int(body) if body else None
+
+
+def remember_total_pages(params, total_pages):
+    tmdb_cache.set(total_pages_key(params), str(total_pages), ENDPOINT_TTLS["discover"], "discover")
+
+
+def fetch_discover_batch(param_sets):
+    """Start fetching a batch of discover pages in parallel, returns futures in page order"""
+    return [tmdb_client.submit(discover_pool, tmdb_client.get, "/discover/movie", params) for params in param_sets]
+
+
+def iter_calendar_movies(theme, min_count, category="all", genre=None, year_from="", year_to="", exclude_titles=[], selected_services=None, reservoir=None, rng=random, progress=None):
+    """Yield lists of new calendar movies as discover pages are consumed
 
-def fetch_streaming_movies(theme, min_count, category="all", genre=None, year_from="", year_to="", exclude_titles=[], only_streaming=True, selected_services=None):
+    Both a forward crawl and random sampling yield after every page that adds
+    movies. progress(pages=, movies=) is called after each page, e.g.
+    Job.update.
+    """
     selected_services = selected_services or ['8','9','337','99']  # Netflix, Prime, Disney+, Shudder
-    print(f"DEBUG: Fetching movies with theme: {theme}, min_count: {min_count}, category: {category}")
+    log.debug("Fetching movies", extra={"theme": theme, "min_count": min_count, "category": category})
 
     movies = []
     seen_ids = set()
@@ -193,153 +468,213 @@ def fetch_streaming_movies(theme, min_count, category="all", genre=None, year_fr
     else:
         sort_options = ['popularity.desc']
 
-    # Special case: General Movies
-    if theme == "Movies":
-        while len(movies) < min_count and page <= max_pages:
-            sort_by = random.choice(sort_options)
-
-            url = (
-                f"https://api.themoviedb.org/3/discover/movie?"
-                f"api_key={API_KEY}&language=en-US&region=GB"
-                f"&sort_by={sort_by}&include_adult=false&include_video=false"
-                f"&with_watch_providers={'|'.join(selected_services)}"
-                f"&watch_region=GB&page={page}&vote_count.gte=500&with_runtime.gte=60&with_original_language=en"
-            )
-            if genre:
-                url += f"&with_genres={genre}"
-            if year_from:
-                url += f"&primary_release_date.gte={year_from}-01-01"
-            if year_to:
-                url += f"&primary_release_date.lte={year_to}-12-31"
-
-            resp = requests.get(url)
-            if resp.status_code != 200:
-                print(f"Discover API error: {resp.text}")
-                break
-
-            results = resp.json().get("results", [])
-            for movie in results:
-                movie_id = movie["id"]
-                if movie_id in seen_ids or movie["title"] in exclude_titles:
-                    continue
-
-                year = movie.get("release_date", "1900")[:4]
-                try:
-                    year = int(year)
-                except ValueError:
-                    year = 1900
-
-                if year > current_year:
-                    continue
-                if category == "modern" and year < current_year - 10:
-                    continue
-                if category == "classics" and year >= current_year - 20:
-                    continue
-
-                movies.append({
-                    "id": movie["id"],
-                    "title": movie["title"],
-                    "release_date": movie.get("release_date", "Unknown"),
-                    "poster_path": movie.get("poster_path"),
-                    "providers": [UK_SERVICE_NAMES.get(int(sid), sid) for sid in selected_services]
-                })
-                seen_ids.add(movie_id)
-
-                if len(movies) >= min_count:
-                    break
-
-            page += 1
-
-        random.shuffle(movies)
-        return movies[:min_count]
-
-    # --- Themed movie logic using DISCOVER endpoint with keywords ---
-    else:
+    keyword_ids = []
+    keyword_string = None
+    if theme != "Movies":
         # Get keyword IDs for the theme
         keyword_ids = get_theme_keywords(theme)
         if not keyword_ids:
-            print(f"No keywords found for theme {theme}, using search fallback")
-            keyword_string = None
+            log.warning("No keywords found for theme %s, using search fallback", theme)
         else:
             # Use pipe (OR) separator for broader results
             keyword_string = "|".join(map(str, keyword_ids))
-            print(f"Using keywords for {theme}: {keyword_string}")
-        
-        while len(movies) < min_count and page <= max_pages:
-            # Use discover endpoint with keywords
-            url = (
-                f"https://api.themoviedb.org/3/discover/movie?"
-                f"api_key={API_KEY}&language=en-US&region=GB"
-                f"&sort_by=popularity.desc&include_adult=false&include_video=false"
-                f"&with_watch_providers={'|'.join(selected_services)}"
-                f"&watch_region=GB&page={page}&vote_count.gte=100"
-            )
-            
-            # Add keywords if available
-            if keyword_string:
-                url += f"&with_keywords={keyword_string}"
-            
-            # Add genre if specified
-            if genre:
-                url += f"&with_genres={genre}"
-            
-            # Add year filters
-            if year_from:
-                url += f"&primary_release_date.gte={year_from}-01-01"
-            if year_to:
-                url += f"&primary_release_date.lte={year_to}-12-31"
-
-            resp = requests.get(url)
-            if resp.status_code != 200:
-                print(f"Discover API error for theme {theme}: {resp.text}")
-                break
-
-            results = resp.json().get("results", [])
-            
-            if not results and page == 1:
-                print(f"No results for {theme} with keywords, trying without")
-                # Retry without keywords if first page has no results
-                if keyword_string:
-                    url = url.replace(f"&with_keywords={keyword_string}", "")
-                    resp = requests.get(url)
-                    if resp.status_code == 200:
-                        results = resp.json().get("results", [])
-            
-            for movie in results:
-                movie_id = movie["id"]
-                if movie_id in seen_ids or movie["title"] in exclude_titles:
-                    continue
-
-                year = movie.get("release_date", "1900")[:4]
-                try:
-                    year = int(year)
-                except ValueError:
-                    year = 1900
-
-                if year > current_year:
-                    continue
-                if category == "modern" and year < current_year - 10:
-                    continue
-                if category == "classics" and year >= current_year - 20:
-                    continue
-
-                movies.append({
-                    "id": movie["id"],
-                    "title": movie["title"],
-                    "release_date": movie.get("release_date", "Unknown"),
-                    "poster_path": movie.get("poster_path"),
-                    "vote_average": movie.get("vote_average", 0),
-                    "providers": [UK_SERVICE_NAMES.get(int(sid), sid) for sid in selected_services]
-                })
-                seen_ids.add(movie_id)
-
-                if len(movies) >= min_count:
-                    break
-
-            page += 1
-
-        random.shuffle(movies)
-        return movies[:min_count]
+            log.debug("Using keywords for %s: %s", theme, keyword_string)
+
+    if release_year_bounds(category, year_from, year_to, current_year) is None:
+        log.info("No release year satisfies category %s with years %r-%r", category, year_from, year_to)
+        metrics.calendar_pages.observe(0)
+        return
+
+    # Indexed local query first; only crawl TMDB when the catalog has gaps
+    spare_count = RESERVOIR_SEED_SIZE if reservoir is not None else 0
+    catalog_movies = find_catalog_movies(theme, min_count + spare_count, category, genre, year_from, year_to,
+                                         exclude_titles, selected_services, keyword_ids, rng)
+    if catalog_movies is not None and len(catalog_movies) >= min_count:
+        log.debug("Served %d movies from the local catalog", min_count)
+        movies = catalog_movies[:min_count]
+        if reservoir is not None:
+            reservoir.add(catalog_movies[min_count:], used_ids=[m["id"] for m in movies])
+        metrics.calendar_pages.observe(0)
+        if progress:
+            progress(pages=0, movies=len(movies))
+        yield movies
+        return
+
+    # One ordering per calendar: pages cut from different orderings overlap and leave gaps
+    sort_by = rng.choice(sort_options)
+
+    def page_params(page):
+        return discover_params(theme, selected_services, genre, year_from, year_to, keyword_string, sort_by, page,
+                               category)
+
+    pages_fetched = 0
+    total_pages = max_pages
+    outcomes = {}  # candidate outcome -> count, flushed to metrics once per calendar
+
+    def read_page(page, future):
+        """Results of a fetched discover page, None when the request failed"""
+        nonlocal pages_fetched, total_pages
+        pages_fetched += 1
+        try:
+            resp = future.result()
+        except requests.exceptions.RequestException as e:
+            log.warning("Discover API request failed for theme %s: %s", theme, e)
+            return None
+        if resp.status_code != 200:
+            log.warning("Discover API error for theme %s: HTTP %s", theme, resp.status_code)
+            return None
+
+        data = resp.json()
+        results = data.get("results", [])
+        total_pages = min(total_pages, data.get("total_pages", total_pages))
+
+        if not results and page == 1 and keyword_string:
+            log.info("No results for %s with keywords, trying without", theme)
+            # Retry without keywords if first page has no results
+            resp = tmdb_client.get("/discover/movie", dict(page_params(1), with_keywords=None))
+            pages_fetched += 1
+            if resp.status_code == 200:
+                results = resp.json().get("results", [])
+        return results
+
+    def accept(movie):
+        """Dedup, title exclusion and year rules, counting each candidate's outcome"""
+        if movie["id"] in seen_ids:
+            outcomes["duplicate"] = outcomes.get("duplicate", 0) + 1
+            return False
+        if movie["title"] in exclude_titles:
+            outcomes["excluded_title"] = outcomes.get("excluded_title", 0) + 1
+            return False
+        rejection = filter_rejection(movie, category, current_year)
+        if rejection:
+            outcomes[rejection] = outcomes.get(rejection, 0) + 1
+            return False
+        outcomes["accepted"] = outcomes.get("accepted", 0) + 1
+        seen_ids.add(movie["id"])
+        return True
+
+    spare = []
+    futures = []
+    try:
+        if DISCOVER_SAMPLING == "random":
+            # Distinct random pages of the whole result set are fetched in parallel
+            # rounds. Each page of a round adds an equal share of the movies still
+            # needed, picked at random, and is yielded as soon as it is read; the
+            # rest of the page seeds the replacement reservoir.
+            first_page = {}
+            known_pages = cached_total_pages(page_params(1))
+            if known_pages is None:
+                # First calendar for these filters: page 1 says how many pages there are.
+                # Its movies are only used if page 1 is then drawn like any other page
+                futures = fetch_discover_batch([page_params(1)])
+                first_page[1] = read_page(1, futures[0])
+                if first_page[1] is not None and total_pages > 0:
+                    remember_total_pages(page_params(1), total_pages)
+            else:
+                total_pages = known_pages
+            unfetched = list(range(1, min(total_pages, max_pages) + 1))
+            if not unfetched and first_page.get(1):
+                unfetched = [1]  # keyword-less retry of an empty page 1
+            drawn = set()
+            round_size = DISCOVER_SAMPLE_PAGES
+            failed = first_page.get(1, []) is None
+            while unfetched and len(movies) < min_count and not failed:
+                batch_pages = rng.sample(unfetched, min(round_size, len(unfetched)))
+                unfetched = [p for p in unfetched if p not in batch_pages]
+                drawn.update(batch_pages)
+                round_size = DISCOVER_BATCH_SIZE
+                futures = fetch_discover_batch([page_params(p) for p in batch_pages if p not in first_page])
+                pending = iter(futures)
+                for index, batch_page in enumerate(batch_pages):
+                    if len(movies) >= min_count and reservoir is None:
+                        break  # nothing left to use the rest of the round for
+                    if batch_page in first_page:
+                        results = first_page.pop(batch_page)
+                    else:
+                        results = read_page(batch_page, next(pending))
+                    if results is None:
+                        failed = True  # finish this round, which is already in flight, but start no other
+                        continue
+                    accepted = [format_discover_movie(movie, selected_services) for movie in results if accept(movie)]
+                    rng.shuffle(accepted)
+                    share = -(-max(0, min_count - len(movies)) // (len(batch_pages) - index))
+                    batch = accepted[:share]
+                    movies.extend(batch)
+                    if reservoir is not None:
+                        spare.extend(accepted[share:])
+                    if progress:
+                        progress(pages=pages_fetched, movies=len(movies))
+                    if batch:
+                        yield batch
+            next_page = 1
+            fetched_pages = drawn
+        else:
+            # Pages are requested in parallel batches; results are still consumed in
+            # page order so the seen_ids dedup and early stop behave as a serial crawl
+            done = False
+            last_page = 0
+            while not done and len(movies) < min_count and page <= min(total_pages, max_pages):
+                batch_pages = range(page, min(page + DISCOVER_BATCH_SIZE, max_pages + 1))
+                futures = fetch_discover_batch([page_params(p) for p in batch_pages])
+
+                for batch_page, future in zip(batch_pages, futures):
+                    if done or batch_page > total_pages:
+                        future.cancel()
+                        continue
+                    results = read_page(batch_page, future)
+                    if results is None:
+                        done = True
+                        continue
+
+                    last_page = batch_page
+                    before = len(movies)
+                    for movie in results:
+                        if not accept(movie):
+                            continue
+                        if len(movies) < min_count:
+                            movies.append(format_discover_movie(movie, selected_services))
+                        elif reservoir is not None:
+                            # Rest of the page seeds the replacement reservoir
+                            spare.append(format_discover_movie(movie, selected_services))
+                        else:
+                            break
+
+                    if len(movies) >= min_count:
+                        # Enough movies, drop whatever is left of this batch
+                        done = True
+                    if progress:
+                        progress(pages=pages_fetched, movies=len(movies))
+                    if len(movies) > before:
+                        yield movies[before:]
+
+                page = batch_pages.stop
+            next_page = last_page + 1
+            fetched_pages = set()
+    finally:
+        # Also reached when a streaming client goes away mid-crawl
+        for future in futures:
+            future.cancel()
+
+    if reservoir is not None:
+        reservoir.next_page = next_page
+        reservoir.skip_pages = fetched_pages
+        # Only the calendar's own movies count as used; spare ids are in seen_ids too
+        reservoir.add(spare, used_ids=[m["id"] for m in movies])
+
+    metrics.calendar_pages.observe(pages_fetched)
+    for outcome, count in outcomes.items():
+        metrics.calendar_candidates.inc(count, outcome=outcome)
+
+
+def fetch_streaming_movies(theme, min_count, category="all", genre=None, year_from="", year_to="", exclude_titles=[], only_streaming=True, selected_services=None, reservoir=None, progress=None):
+    selected_services = selected_services or ['8','9','337','99']  # Netflix, Prime, Disney+, Shudder
+    rng = seeded_random("calendar", theme, min_count, category, genre, year_from, year_to,
+                        sorted(map(str, selected_services)))
+    movies = [movie for batch in iter_calendar_movies(theme, min_count, category, genre, year_from, year_to,
+                                                      exclude_titles, selected_services, reservoir, rng, progress)
+              for movie in batch]
+    rng.shuffle(movies)
+    return movies[:min_count]
 
 
 @app.route("/")
@@ -347,20 +682,21 @@ def index():
     return render_template("index.html", user=current_user)
 
 
-@app.route("/get_movies", methods=["POST"])
-def get_movies():
-    print("Received request for get_movies")
-    data = request.get_json()  # Get JSON from AJAX
-    print(f"Data received: {data}")
+def calendar_query_key(theme, min_count, category, genre, year_from, year_to, selected_services):
+    """Normalized calendar query used to coalesce identical /get_movies requests"""
+    return (theme, min_count, category or "all", str(genre or ""), str(year_from or ""), str(year_to or ""),
+            tuple(sorted(map(str, selected_services))))
+
+
+def resolve_calendar_request(data):
+    """(theme, min_count, display_month, genre) for a /get_movies payload"""
     month_name = data.get("month", "")
     theme_input = data.get("theme", "")
-    category = data.get("category", "all")
 
     # Determine theme and day count based on selections
     if month_name:
         try:
             month_number = datetime.strptime(month_name, "%B").month
-            print(f"Parsed month: {month_name} to {month_number}")
             days_in_month = monthrange(datetime.now().year, month_number)[1]
 
             # If theme is also selected, use it; otherwise use month-based theme
@@ -373,7 +709,7 @@ def get_movies():
 
             min_count = days_in_month
         except Exception as e:
-            print(f"Error parsing month: {e}")
+            log.info("Could not parse month %r: %s", month_name, e)
             month_number = datetime.now().month
             days_in_month = monthrange(datetime.now().year, month_number)[1]
 
@@ -395,84 +731,256 @@ def get_movies():
     # Default to Family genre for Christmas unless user specifies otherwise
     if theme == "Christmas" and not genre_input:
         genre = "10751"  # Family genre
-        print(f"Defaulting Christmas theme to Family genre (10751)")
     else:
         genre = genre_input if genre_input else None
+    return theme, min_count, display_month, genre
+
+
+@app.route("/get_movies", methods=["POST"])
+def get_movies():
+    data = request.get_json()  # Get JSON from AJAX
+    log.debug("get_movies request: %s", data)
+    category = data.get("category", "all")
+    theme, min_count, display_month, genre = resolve_calendar_request(data)
     year_from = data.get("year_from", "")
     year_to = data.get("year_to", "")
-    print(f"Fetching movies for theme: {theme}, genre: {genre}, year_from: {year_from}, year_to: {year_to}, min_count: {min_count}, category: {category}")
     only_streaming = data.get('only_streaming', True)
     exclude_titles = []
     selected_services = data.get('services', ['8','9','337'])
-    movies = fetch_streaming_movies(theme, min_count, category, genre, year_from, year_to, exclude_titles, only_streaming, selected_services)
-    print(f"Fetched {len(movies)} movies")
+    # Leftovers from this crawl back the replace button for the same filters
+    reservoir = new_replacement_reservoir(theme, category, genre, year_from, year_to, selected_services)
+
+    flight_key = calendar_query_key(theme, min_count, category, genre, year_from, year_to, selected_services)
+    # A nightly precomputed pool turns the common month/category/services queries into a read
+    movies = precomputed_calendar(flight_key, min_count, exclude_titles, reservoir)
+
+    stream_format = requested_stream_format(data)
+    if stream_format:
+        seed = ("calendar", theme, min_count, category, genre, year_from, year_to, sorted(map(str, selected_services)))
+        rng = seeded_random(*seed)
+        if movies is not None:
+            batches = [movies]
+        else:
+            # Identical streams arriving together share one crawl; it gets its own rng, since
+            # whichever of those requests needs the next page is the one that reads it
+            batches, shared = calendar_stream_flights.do(
+                flight_key, iter_calendar_movies, theme, min_count, category, genre, year_from, year_to,
+                exclude_titles, selected_services, reservoir, seeded_random(*seed))
+            log.debug("Streaming calendar", extra={"theme": theme, "shared_crawl": shared})
+        body = stream_calendar(stream_format, batches, rng, theme, min_count, display_month, category, genre)
+        return Response(body, mimetype=STREAM_FORMATS[stream_format],
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    shared = False
+    if movies is None:
+        # Identical queries arriving together share one crawl, then get their own shuffle
+        movies, shared = calendar_flights.do(flight_key, fetch_streaming_movies, theme, min_count, category, genre,
+                                             year_from, year_to, exclude_titles, only_streaming, selected_services,
+                                             reservoir)
+        movies = list(movies)
+    seeded_random("shuffle", flight_key).shuffle(movies)
+    log.info("Built calendar", extra={"theme": theme, "genre": genre, "category": category, "year_from": year_from,
+                                      "year_to": year_to, "requested": min_count, "returned": len(movies),
+                                      "shared_crawl": shared})
+
+    message = short_calendar_message(len(movies), min_count)
+    return jsonify({"movies": movies, "month": display_month, "category": category, "message": message})
 
-    message = ""
-    if len(movies) < min_count:
-        message = f"There are only {len(movies)} movies matching your criteria. Please adjust the filters (e.g., year range or genre) to find more results."
 
-    return jsonify({"movies": movies, "month": display_month, "category": category, "message": message})
+def precomputed_calendar(query_key, min_count, exclude_titles, reservoir):
+    """A calendar sampled from the precomputed pool for this query, None when there is no usable pool"""
+    pool = precomputed_calendars.get(query_key)
+    if pool is None:
+        return None
+    pool = [movie for movie in pool if movie["title"] not in exclude_titles]
+    if len(pool) < min_count:
+        return None
+    movies = seeded_random("precomputed", query_key).sample(pool, min_count)
+    if reservoir is not None:
+        # The rest of the pool backs the replace button
+        reservoir.add(pool, used_ids=[movie["id"] for movie in movies])
+    metrics.calendar_pages.observe(0)
+    return movies
+
+
+def short_calendar_message(count, min_count):
+    metrics.calendars.inc(result="short" if count < min_count else "full")
+    if count < min_count:
+        return f"There are only {count} movies matching your criteria. Please adjust the filters (e.g., year range or genre) to find more results."
+    return ""
+
+
+def requested_stream_format(data):
+    """'ndjson' or 'sse' when the client asked for a streamed calendar, otherwise None"""
+    if data.get("stream") in STREAM_FORMATS:
+        return data["stream"]
+    best = request.accept_mimetypes.best_match(["application/json", *STREAM_FORMATS.values()])
+    for stream_format, mimetype in STREAM_FORMATS.items():
+        if best == mimetype:
+            return stream_format
+    return None
+
+
+def encode_stream_event(stream_format, event):
+    if stream_format == "sse":
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
+
+
+def stream_calendar(stream_format, batches, rng, theme, min_count, display_month, category, genre):
+    """Calendar events as each batch of movies arrives: "movies" batches, then one "done"
+
+    Each batch carries start_day, the calendar day of its first movie, and is
+    shuffled on its own since later batches are not known yet.
+    """
+    count = 0
+    try:
+        for batch in batches:
+            batch = list(batch)  # batches can be shared with other requests' streams
+            rng.shuffle(batch)
+            yield encode_stream_event(stream_format, {"type": "movies", "start_day": count + 1, "movies": batch})
+            count += len(batch)
+    except Exception:
+        # Headers are long gone, so the failure has to travel in the stream
+        log.exception("Streaming calendar failed for theme %s", theme)
+        yield encode_stream_event(stream_format, {"type": "error", "message": "Could not load more movies."})
+        return
+
+    log.info("Streamed calendar", extra={"theme": theme, "genre": genre, "category": category,
+                                         "requested": min_count, "returned": count})
+    yield encode_stream_event(stream_format, {
+        "type": "done", "month": display_month, "category": category, "count": count,
+        "message": short_calendar_message(count, min_count),
+        # The Warning header went out before the body; later batches report staleness here
+        "stale": tmdb_client.served_stale(),
+    })
+
+
+def build_calendar_job(job, theme, min_count, display_month, category, genre, year_from, year_to,
+                       selected_services, reservoir_key):
+    """Job body: the /get_movies JSON for a calendar, with pages and movies reported as it goes
+
+    The submitter's replacement reservoir is only replaced here, once the job
+    really starts; a submit that reuses a job leaves the caller's alone.
+    """
+    job.update(pages=0, movies=0, target=min_count)
+    reservoir = new_replacement_reservoir(theme, category, genre, year_from, year_to, selected_services,
+                                          reservoir_key)
+    flight_key = calendar_query_key(theme, min_count, category, genre, year_from, year_to, selected_services)
+    movies = precomputed_calendar(flight_key, min_count, [], reservoir)
+    if movies is None:
+        movies = fetch_streaming_movies(theme, min_count, category, genre, year_from, year_to, [], True,
+                                        selected_services, reservoir, progress=job.update)
+    job.update(movies=len(movies))
+    log.info("Built calendar in background", extra={"job": job.id, "theme": theme, "category": category,
+                                                   "requested": min_count, "returned": len(movies)})
+    return {"movies": movies, "month": display_month, "category": category,
+            "message": short_calendar_message(len(movies), min_count)}
+
+
+def calendar_job_state(job):
+    """What pollers see: state, progress, and the calendar once it is done"""
+    state = job.to_dict()
+    state["status_url"] = url_for("calendar_job_status", job_id=job.id)
+    state["events_url"] = url_for("calendar_job_events", job_id=job.id)
+    if job.state == DONE:
+        result = dict(job.result, movies=list(job.result["movies"]))
+        # Results are shared by everyone submitting the same spec; each poll gets its own order
+        seeded_random("shuffle", job.key).shuffle(result["movies"])
+        state["result"] = result
+    return state
+
+
+@app.route("/calendar_jobs", methods=["POST"])
+def submit_calendar_job():
+    """Start building a calendar in the background; takes the /get_movies payload, answers 202 with a job"""
+    data = request.get_json()
+    category = data.get("category", "all")
+    theme, min_count, display_month, genre = resolve_calendar_request(data)
+    year_from = data.get("year_from", "")
+    year_to = data.get("year_to", "")
+    selected_services = data.get('services', ['8','9','337'])
+    # Only the key is taken here, where the session is; the job creates the reservoir if it runs
+    reservoir_key = replacement_reservoir_key(theme, category, genre, year_from, year_to, selected_services)
+
+    key = (display_month, *calendar_query_key(theme, min_count, category, genre, year_from, year_to, selected_services))
+    try:
+        job = calendar_jobs.submit(key, build_calendar_job, theme, min_count, display_month, category, genre,
+                                   year_from, year_to, selected_services, reservoir_key)
+    except QueueFull:
+        return jsonify({"error": "Too many calendars are being built right now, please try again shortly."}), 503, \
+            {"Retry-After": "5"}
+    return jsonify(calendar_job_state(job)), 202, {"Location": url_for("calendar_job_status", job_id=job.id)}
+
+
+@app.route("/calendar_jobs/<job_id>")
+def calendar_job_status(job_id):
+    job = calendar_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(calendar_job_state(job))
+
+
+@app.route("/calendar_jobs/<job_id>/events")
+def calendar_job_events(job_id):
+    """Server-sent "progress" events for a job, then one "done" or "failed" carrying the final state"""
+    job = calendar_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    def events():
+        version = None
+        while True:
+            current = job.wait(version, timeout=JOB_EVENTS_KEEPALIVE)
+            if current == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            state = calendar_job_state(job)
+            yield encode_stream_event("sse", dict(state, type=job.state if job.finished else "progress"))
+            if job.finished:
+                return
+
+    # url_for inside the generator needs the request context
+    return Response(stream_with_context(events()), mimetype=STREAM_FORMATS["sse"],
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 def fetch_single_replacement_movie(theme, category, genre, year_from, year_to, exclude_titles, only_streaming, selected_services):
     current_year = datetime.now().year
 
-    # Use discover for all movies (general and themed)
-    if theme == "Movies":
-        # General movies - use broad discover
-        url = (
-            f"https://api.themoviedb.org/3/discover/movie?api_key={API_KEY}"
-            f"&language=en-US&region=GB&include_adult=false&include_video=false"
-            f"&sort_by=popularity.desc&vote_count.gte=500&with_runtime.gte=60&with_original_language=en"
-            f"&with_watch_providers={'|'.join(selected_services)}"
-            f"&watch_region=GB"
-        )
-    else:
-        # Themed movies - use discover with keywords
+    keyword_ids = []
+    keyword_string = None
+    if theme != "Movies":
         keyword_ids = get_theme_keywords(theme)
         keyword_string = "|".join(map(str, keyword_ids)) if keyword_ids else None
-        
-        url = (
-            f"https://api.themoviedb.org/3/discover/movie?api_key={API_KEY}"
-            f"&language=en-US&region=GB&include_adult=false&include_video=false"
-            f"&sort_by=popularity.desc&vote_count.gte=100"
-            f"&with_watch_providers={'|'.join(selected_services)}"
-            f"&watch_region=GB"
-        )
-        
-        if keyword_string:
-            url += f"&with_keywords={keyword_string}"
-
-    if genre:
-        url += f"&with_genres={genre}"
-    if year_from:
-        url += f"&primary_release_date.gte={year_from}-01-01"
-    if year_to:
-        url += f"&primary_release_date.lte={year_to}-12-31"
-
-    response = requests.get(url)
+
+    # A page worth of catalog candidates stands in for discover page 1
+    candidates = find_catalog_movies(theme, 20, category, genre, year_from, year_to,
+                                     exclude_titles, selected_services, keyword_ids)
+    rng = seeded_random("replacement", theme, category, genre, year_from, year_to, sorted(exclude_titles))
+    if candidates:
+        return rng.choice(candidates)
+
+    if release_year_bounds(category, year_from, year_to, current_year) is None:
+        return None
+
+    # Use discover for all movies (general and themed)
+    params = discover_params(theme, selected_services, genre, year_from, year_to, keyword_string, category=category)
+
+    response = tmdb_client.get("/discover/movie", params)
     if response.status_code != 200:
-        print(f"Discover API error: {response.text}")
+        log.warning("Discover API error for replacement: HTTP %s", response.status_code)
         return None
 
     results = response.json().get("results", [])
-    random.shuffle(results)  # Randomize order
+    rng.shuffle(results)  # Randomize order
 
     for movie in results:
         if movie["title"] in exclude_titles:
             continue
-
-        year = movie.get("release_date", "1900")[:4]
-        try:
-            year = int(year)
-        except ValueError:
-            year = 1900
-
-        if year > current_year:
-            continue
-        if category == "modern" and year < current_year - 10:
-            continue
-        if category == "classics" and year >= current_year - 20:
+        # Still checked: TMDB's primary_release_date can disagree with the release_date it returns
+        if not movie_passes_filters(movie, category, current_year):
             continue
 
         # Movie is already filtered by streaming services in discover endpoint
@@ -486,10 +994,53 @@ def fetch_single_replacement_movie(theme, category, genre, year_from, year_to, e
     
     return None
 
+def discover_page_loader(theme, category, genre, year_from, year_to, selected_services):
+    """load_page callable for a CandidateReservoir: one filtered discover page per call"""
+
+    def load_page(page, priority=BACKGROUND):
+        # Resolved on first load, so creating a reservoir never waits on a keyword lookup
+        keyword_ids = get_theme_keywords(theme) if theme != "Movies" else []
+        keyword_string = "|".join(map(str, keyword_ids)) if keyword_ids else None
+        current_year = datetime.now().year
+        params = discover_params(theme, selected_services, genre, year_from, year_to, keyword_string, page=page,
+                                 category=category)
+        try:
+            response = tmdb_client.get("/discover/movie", params, priority=priority)
+        except requests.exceptions.RequestException as e:
+            log.warning("Discover API request failed while refilling replacements: %s", e)
+            return None
+        if response.status_code != 200:
+            log.warning("Discover API error while refilling replacements: HTTP %s", response.status_code)
+            return None
+        data = response.json()
+        movies = [format_discover_movie(movie, selected_services) for movie in data.get("results", [])
+                  if movie_passes_filters(movie, category, current_year)]
+        return movies, data.get("total_pages", 0)
+
+    return load_page
+
+
+def replacement_reservoir_key(theme, category, genre, year_from, year_to, selected_services):
+    if "reservoir_id" not in session:
+        session["reservoir_id"] = uuid.uuid4().hex
+    filters = (theme, category, genre or "", year_from or "", year_to or "", tuple(sorted(map(str, selected_services))))
+    return session["reservoir_id"], filters
+
+
+def new_replacement_reservoir(theme, category, genre, year_from, year_to, selected_services, key=None):
+    """Fresh reservoir for this session and filter set, replacing any older one
+
+    Outside a request, pass the key replacement_reservoir_key gave in it.
+    """
+    key = key or replacement_reservoir_key(theme, category, genre, year_from, year_to, selected_services)
+    load_page = discover_page_loader(theme, category, genre, year_from, year_to, selected_services)
+    return replacement_reservoirs.put(key, CandidateReservoir(load_page, discover_pool))
+
+
 @app.route("/get_replacement_movie", methods=["POST"])
 def get_replacement_movie():
     data = request.get_json()
-    print(f"Replacement request data: {data}")
+    log.debug("get_replacement_movie request: %s", data)
     month_name = data.get("month", "")
     theme_input = data.get("theme", "")
     genre_input = data.get("genre", "")
@@ -497,7 +1048,6 @@ def get_replacement_movie():
     year_from = data.get("year_from", "")
     year_to = data.get("year_to", "")
     exclude_titles = data.get("current_titles", [])
-    print(f"Exclude titles: {exclude_titles}")
 
     genre = genre_input if genre_input else None
 
@@ -528,9 +1078,28 @@ def get_replacement_movie():
 
     only_streaming = data.get('only_streaming', True)
     selected_services = data.get('services', ['8','9','337'])
-    movie = fetch_single_replacement_movie(theme, category, genre, year_from, year_to, exclude_titles, only_streaming, selected_services)
+
+    # Prefer ids; titles are still accepted from older clients
+    exclude_ids = set()
+    for movie_id in data.get("current_ids", []):
+        try:
+            exclude_ids.add(int(movie_id))
+        except (TypeError, ValueError):
+            continue
+    exclude_titles = set(exclude_titles)
+
+    key = replacement_reservoir_key(theme, category, genre, year_from, year_to, selected_services)
+    reservoir = replacement_reservoirs.get(key)
+    if reservoir is None:
+        reservoir = new_replacement_reservoir(theme, category, genre, year_from, year_to, selected_services)
+    movie = reservoir.pop(exclude_ids, set() if exclude_ids else exclude_titles)
+    source = "reservoir"
+    if movie is None:
+        movie = fetch_single_replacement_movie(theme, category, genre, year_from, year_to, exclude_titles, only_streaming, selected_services)
+        source = "discover" if movie else "none"
+    metrics.replacements.inc(source=source)
     if movie:
-        print(f"Selected replacement movie: {movie['title']}")
+        log.debug("Selected replacement movie %s", movie['id'])
         return jsonify({"movie": movie})
     else:
         return jsonify({"error": "No replacement movie found"}), 404
@@ -541,18 +1110,48 @@ def save_list():
     data = request.get_json()
     name = data.get('name', 'My Movie List')
     movies = data.get('movies', [])
-    movie_list = MovieList(name=name, movies=json.dumps(movies), user_id=current_user.id)
+    movie_list = MovieList(name=name, user_id=current_user.id)
+    movie_list.items = [MovieListItem.from_movie(position, movie) for position, movie in enumerate(movies)]
     db.session.add(movie_list)
     db.session.commit()
     return jsonify({'success': True})
 
+def encode_list_cursor(movie_list):
+    return f"{movie_list.created_at.isoformat()}_{movie_list.id}"
+
+def decode_list_cursor(cursor):
+    try:
+        created_at, list_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(list_id)
+    except (AttributeError, ValueError):
+        return None
+
 @app.route('/my_lists')
 @login_required
 def my_lists():
-    lists = MovieList.query.filter_by(user_id=current_user.id).order_by(MovieList.created_at.desc()).all()
-    for lst in lists:
-        lst.parsed_movies = json.loads(lst.movies)
-    return render_template('my_lists.html', lists=lists)
+    # Keyset pagination on (created_at, id), newest first, served by the composite index
+    query = MovieList.query.filter_by(user_id=current_user.id)
+    cursor = decode_list_cursor(request.args.get('before'))
+    if cursor:
+        created_at, list_id = cursor
+        query = query.filter(db.or_(
+            MovieList.created_at < created_at,
+            db.and_(MovieList.created_at == created_at, MovieList.id < list_id)
+        ))
+    lists = query.order_by(MovieList.created_at.desc(), MovieList.id.desc()).limit(LISTS_PER_PAGE + 1).all()
+    next_cursor = encode_list_cursor(lists[LISTS_PER_PAGE - 1]) if len(lists) > LISTS_PER_PAGE else None
+    return render_template('my_lists.html', lists=lists[:LISTS_PER_PAGE], next_cursor=next_cursor,
+                           first_page=cursor is None)
+
+@app.route('/my_lists/<int:list_id>/items')
+@login_required
+def my_list_items(list_id):
+    """Movies of one saved list, loaded by the page as each list scrolls into view"""
+    movie_list = MovieList.query.filter_by(id=list_id, user_id=current_user.id).first()
+    if not movie_list:
+        return jsonify({'error': 'List not found'}), 404
+    items = MovieListItem.query.filter_by(list_id=list_id).order_by(MovieListItem.position).all()
+    return jsonify({'movies': [item.to_dict() for item in items]})
 
 @app.route('/delete_list', methods=['POST'])
 @login_required
@@ -571,20 +1170,16 @@ def delete_list():
 def test_tmdb_api():
     """Test endpoint to check TMDB API connectivity"""
     try:
-        print("DEBUG: Testing TMDB API connectivity...")
-
         # Test with a known movie ID (The Dark Knight)
         test_movie_id = 155
-        url = f"https://api.themoviedb.org/3/movie/{test_movie_id}?api_key={API_KEY}&language=en-US"
-        print(f"DEBUG: Test URL: {url}")
 
-        response = requests.get(url, timeout=10)
-        print(f"DEBUG: Test response status: {response.status_code}")
-        print(f"DEBUG: Test response headers: {dict(response.headers)}")
+        # Bypass the cache so this really measures the upstream round trip
+        response = tmdb_client.get(f"/movie/{test_movie_id}", {"language": "en-US"}, use_cache=False,
+                                   priority=INTERACTIVE)
+        log.info("TMDB connectivity test returned HTTP %s", response.status_code)
 
         if response.status_code == 200:
             data = response.json()
-            print(f"DEBUG: Test successful - Movie: {data.get('title', 'Unknown')}")
             return jsonify({
                 'status': 'success',
                 'movie_title': data.get('title'),
@@ -592,22 +1187,21 @@ def test_tmdb_api():
                 'response_time_ms': response.elapsed.total_seconds() * 1000
             })
         elif response.status_code == 401:
-            print("ERROR: Invalid API key")
+            log.error("TMDB connectivity test: invalid API key")
             return jsonify({
                 'status': 'error',
                 'error': 'Invalid API key',
                 'api_key_valid': False
             }), 401
         elif response.status_code == 429:
-            print("ERROR: Rate limited")
+            log.warning("TMDB connectivity test: rate limited")
             return jsonify({
                 'status': 'error',
                 'error': 'Rate limited by TMDB API',
                 'api_key_valid': True
             }), 429
         else:
-            print(f"ERROR: Unexpected response: {response.status_code}")
-            print(f"ERROR: Response text: {response.text}")
+            log.error("TMDB connectivity test: unexpected response %s: %s", response.status_code, response.text)
             return jsonify({
                 'status': 'error',
                 'error': f'Unexpected response: {response.status_code}',
@@ -616,13 +1210,72 @@ def test_tmdb_api():
             }), response.status_code
 
     except Exception as e:
-        print(f"ERROR: Exception during TMDB API test: {str(e)}")
+        log.exception("TMDB connectivity test failed")
         return jsonify({
             'status': 'error',
             'error': f'Exception: {str(e)}',
             'api_key_valid': None
         }), 500
 
+@app.route('/cache_stats')
+def cache_stats():
+    """Hit/miss counters for the TMDB response cache"""
+    return jsonify(tmdb_cache.stats())
+
+@app.before_request
+def track_stale_responses():
+    tmdb_client.begin_request()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.http_latency.observe(time.perf_counter() - started, route=route, method=request.method,
+                                     status=response.status_code)
+    return response
+
+metrics.registry.gauge("tmdb_circuit_open", "1 while the TMDB circuit breaker is open or half-open",
+                       lambda: int(tmdb_client.breaker.stats()["state"] != "closed"))
+metrics.registry.gauge("tmdb_scheduler_queue_depth", "Requests waiting for a TMDB rate-limit slot, by priority",
+                       lambda: {(name,): depth for name, depth in tmdb_scheduler.queue_depth().items()},
+                       labels=("priority",))
+metrics.registry.gauge("calendar_jobs_pending", "Background calendar jobs queued or running",
+                       calendar_jobs.pending)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format scrape endpoint
+
+    Under gunicorn the counters and histograms are summed over every worker,
+    other workers' as of their last snapshot (METRICS_FLUSH_INTERVAL). Gauges
+    describe the worker that served the scrape.
+    """
+    return Response(metrics.registry.render(shared_metrics.others()), mimetype='text/plain; version=0.0.4')
+
+@app.after_request
+def mark_stale_responses(response):
+    # Anything built from last-known-good data while TMDB was failing is flagged; a streamed
+    # body is produced after this runs, so streams carry the flag on their "done" event
+    if tmdb_client.served_stale():
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/circuit_stats')
+def circuit_stats():
+    """State of the circuit breaker around the TMDB client"""
+    return jsonify(tmdb_client.breaker.stats())
+
+@app.route('/scheduler_stats')
+def scheduler_stats():
+    """Token bucket state and queue depth per priority for outbound TMDB calls"""
+    return jsonify(tmdb_scheduler.stats())
+
 @app.route('/search_movies')
 def search_movies():
     """Search for movies using TMDB API"""
@@ -631,21 +1284,20 @@ def search_movies():
         if not query:
             return jsonify({'error': 'No search query provided'}), 400
 
-        print(f"DEBUG: Searching for movies with query: {query}")
-
-        url = (
-            f"https://api.themoviedb.org/3/search/movie?"
-            f"api_key={API_KEY}&language=en-US&region=GB"
-            f"&query={requests.utils.quote(query)}"
-            f"&include_adult=false&with_watch_providers=8|9|337|99"
-            f"&watch_region=GB&page=1"
-        )
+        params = {
+            "language": "en-US",
+            "region": "GB",
+            "query": query,
+            "include_adult": "false",
+            "with_watch_providers": "8|9|337|99",
+            "watch_region": "GB",
+            "page": 1,
+        }
 
-        response = requests.get(url, timeout=10)
-        print(f"DEBUG: TMDB search response status: {response.status_code}")
+        response = tmdb_client.get("/search/movie", params, priority=INTERACTIVE)
 
         if response.status_code != 200:
-            print(f"ERROR: TMDB search failed: {response.text}")
+            log.error("TMDB search failed: HTTP %s", response.status_code)
             return jsonify({'error': 'Failed to search movies'}), 502
 
         data = response.json()
@@ -664,11 +1316,11 @@ def search_movies():
                     'overview': movie.get('overview', '')[:200] + '...' if len(movie.get('overview', '')) > 200 else movie.get('overview', '')
                 })
 
-        print(f"DEBUG: Found {len(movies)} movies for query: {query}")
+        log.debug("Found %d movies for query %r", len(movies), query)
         return jsonify({'movies': movies})
 
     except Exception as e:
-        print(f"ERROR: Exception during movie search: {str(e)}")
+        log.exception("Movie search failed")
         return jsonify({'error': 'Search failed'}), 500
 
 @app.route('/search_movies_where_to_watch')
@@ -679,139 +1331,193 @@ def search_movies_where_to_watch():
         if not query:
             return jsonify({'error': 'No search query provided'}), 400
 
-        print(f"DEBUG: Searching for movies with streaming info - query: {query}")
-
         # First, search for movies
-        search_url = (
-            f"https://api.themoviedb.org/3/search/movie?"
-            f"api_key={API_KEY}&language=en-US&region=GB"
-            f"&query={requests.utils.quote(query)}"
-            f"&include_adult=false&page=1"
-        )
+        search_params = {
+            "language": "en-US",
+            "region": "GB",
+            "query": query,
+            "include_adult": "false",
+            "page": 1,
+        }
 
-        search_response = requests.get(search_url, timeout=10)
-        print(f"DEBUG: TMDB search response status: {search_response.status_code}")
+        search_response = tmdb_client.get("/search/movie", search_params, priority=INTERACTIVE)
 
         if search_response.status_code != 200:
-            print(f"ERROR: TMDB search failed: {search_response.text}")
+            log.error("TMDB search failed: HTTP %s", search_response.status_code)
             return jsonify({'error': 'Failed to search movies'}), 502
 
         search_data = search_response.json()
         results = search_data.get('results', [])
 
         # Filter and format results with streaming information
-        movies = []
-        for movie in results[:8]:  # Limit to top 8 results for better performance
-            if movie.get('poster_path') and movie.get('vote_count', 0) >= 50:
-                movie_id = movie['id']
-
-                # Get streaming providers for this movie in the UK
-                providers_url = f"https://api.themoviedb.org/3/movie/{movie_id}/watch/providers?api_key={API_KEY}"
-                providers_response = requests.get(providers_url, timeout=10)
-
-                streaming_providers = []
-                if providers_response.status_code == 200:
-                    providers_data = providers_response.json()
-                    uk_providers = providers_data.get('results', {}).get('GB', {})
-
-                    # Get flatrate (subscription) providers
-                    flatrate = uk_providers.get('flatrate', [])
-                    for provider in flatrate:
-                        provider_name = provider.get('provider_name', '')
-                        if provider_name in ['Netflix', 'Amazon Prime Video', 'Disney+', 'Paramount+', 'Apple TV+', 'Shudder']:
-                            streaming_providers.append(provider_name)
+        candidates = [movie for movie in results[:8]  # Limit to top 8 results for better performance
+                      if movie.get('poster_path') and movie.get('vote_count', 0) >= 50]
 
-                movies.append({
-                    'id': movie['id'],
-                    'title': movie['title'],
-                    'release_date': movie.get('release_date', ''),
-                    'poster_path': movie.get('poster_path', ''),
-                    'vote_average': movie.get('vote_average', 0),
-                    'overview': movie.get('overview', '')[:300] + '...' if len(movie.get('overview', '')) > 300 else movie.get('overview', ''),
-                    'streaming_providers': streaming_providers
-                })
+        # Get streaming providers for all candidates in the UK at once
+        providers_by_id = tmdb_client.get_watch_providers_many([movie['id'] for movie in candidates], "GB")
+
+        movies = []
+        for movie in candidates:
+            uk_providers = providers_by_id.get(movie['id']) or {}
+
+            # Get flatrate (subscription) providers
+            streaming_providers = []
+            for provider in uk_providers.get('flatrate', []):
+                provider_name = provider.get('provider_name', '')
+                if provider_name in ['Netflix', 'Amazon Prime Video', 'Disney+', 'Paramount+', 'Apple TV+', 'Shudder']:
+                    streaming_providers.append(provider_name)
+
+            movies.append({
+                'id': movie['id'],
+                'title': movie['title'],
+                'release_date': movie.get('release_date', ''),
+                'poster_path': movie.get('poster_path', ''),
+                'vote_average': movie.get('vote_average', 0),
+                'overview': movie.get('overview', '')[:300] + '...' if len(movie.get('overview', '')) > 300 else movie.get('overview', ''),
+                'streaming_providers': streaming_providers
+            })
 
-        print(f"DEBUG: Found {len(movies)} movies with streaming info for query: {query}")
+        log.debug("Found %d movies with streaming info for query %r", len(movies), query)
         return jsonify({'movies': movies})
 
     except Exception as e:
-        print(f"ERROR: Exception during where to watch search: {str(e)}")
+        log.exception("Where to watch search failed")
         return jsonify({'error': 'Search failed'}), 500
 
+def format_movie_details(movie_id, movie_data):
+    """Shape a TMDB /movie/{id} payload for the info panel"""
+    overview = movie_data.get('overview', '').strip()
+    if not overview:
+        log.debug("No overview found for movie %s", movie_id)
+        overview = 'No plot information available for this movie.'
+
+    return {
+        'title': movie_data.get('title', 'Unknown Title'),
+        'overview': overview,
+        'plot': overview,  # Alternative field name for compatibility
+        'release_date': movie_data.get('release_date', ''),
+        'vote_average': movie_data.get('vote_average', 0),
+        'runtime': movie_data.get('runtime', 0),
+        'genres': [genre['name'] for genre in movie_data.get('genres', [])],
+        'poster_path': movie_data.get('poster_path', ''),
+        'backdrop_path': movie_data.get('backdrop_path', ''),
+        'imdb_id': movie_data.get('imdb_id', ''),
+        'original_language': movie_data.get('original_language', ''),
+        'production_countries': [country['name'] for country in movie_data.get('production_countries', [])],
+        'tagline': movie_data.get('tagline', ''),
+        'status': movie_data.get('status', 'Unknown')
+    }
+
+
+def revalidatable_json(payload):
+    """jsonify with an ETag and Cache-Control so browsers can revalidate cheaply"""
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = DETAILS_CACHE_CONTROL
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 @app.route('/movie/<int:movie_id>')
 def get_movie_details(movie_id):
     """Fetch detailed movie information from TMDB API"""
     try:
-        url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={API_KEY}&language=en-US"
-        print(f"DEBUG: Requesting movie details for ID {movie_id} from URL: {url}")
-
-        response = requests.get(url, timeout=10)
-        print(f"DEBUG: TMDB API response status: {response.status_code}")
-        print(f"DEBUG: TMDB API response headers: {dict(response.headers)}")
+        response = tmdb_client.get(f"/movie/{movie_id}", {"language": "en-US"}, priority=INTERACTIVE)
 
         if response.status_code != 200:
-            print(f"ERROR: Failed to fetch movie details for ID {movie_id}")
-            print(f"ERROR: Response status: {response.status_code}")
-            print(f"ERROR: Response text: {response.text}")
-            print(f"ERROR: Response headers: {dict(response.headers)}")
+            log.warning("Failed to fetch movie details for %s: HTTP %s", movie_id, response.status_code)
             return jsonify({'error': 'Movie details not found'}), 404
 
-        movie_data = response.json()
-        print(f"DEBUG: Successfully fetched movie data for ID {movie_id}")
-        print(f"DEBUG: Movie title: {movie_data.get('title', 'Unknown')}")
-        print(f"DEBUG: Overview length: {len(movie_data.get('overview', ''))}")
-        print(f"DEBUG: Available keys in response: {list(movie_data.keys())}")
-
-        # Format the movie details for frontend
-        overview = movie_data.get('overview', '').strip()
-        if not overview:
-            print(f"WARNING: No overview found for movie ID {movie_id}: {movie_data.get('title', 'Unknown')}")
-            overview = 'No plot information available for this movie.'
-        elif len(overview) < 50:
-            print(f"WARNING: Very short overview for movie ID {movie_id}: {movie_data.get('title', 'Unknown')} - '{overview}'")
-
-        movie_details = {
-            'title': movie_data.get('title', 'Unknown Title'),
-            'overview': overview,
-            'plot': overview,  # Alternative field name for compatibility
-            'release_date': movie_data.get('release_date', ''),
-            'vote_average': movie_data.get('vote_average', 0),
-            'runtime': movie_data.get('runtime', 0),
-            'genres': [genre['name'] for genre in movie_data.get('genres', [])],
-            'poster_path': movie_data.get('poster_path', ''),
-            'backdrop_path': movie_data.get('backdrop_path', ''),
-            'imdb_id': movie_data.get('imdb_id', ''),
-            'original_language': movie_data.get('original_language', ''),
-            'production_countries': [country['name'] for country in movie_data.get('production_countries', [])],
-            'tagline': movie_data.get('tagline', ''),
-            'status': movie_data.get('status', 'Unknown')
-        }
-
-        print(f"DEBUG: Returning movie details for: {movie_details['title']}")
-        return jsonify(movie_details)
+        movie_details = format_movie_details(movie_id, response.json())
+        return revalidatable_json(movie_details)
 
     except requests.exceptions.Timeout:
-        print(f"ERROR: Timeout fetching movie details for ID {movie_id}")
+        log.error("Timeout fetching movie details for %s", movie_id)
         return jsonify({'error': 'Request timeout - TMDB API unavailable'}), 504
     except requests.exceptions.ConnectionError as e:
-        print(f"ERROR: Connection error fetching movie details for ID {movie_id}: {str(e)}")
+        log.error("Connection error fetching movie details for %s: %s", movie_id, e)
         return jsonify({'error': 'Connection error - Cannot reach TMDB API'}), 502
     except requests.exceptions.HTTPError as e:
-        print(f"ERROR: HTTP error fetching movie details for ID {movie_id}: {str(e)}")
+        log.error("HTTP error fetching movie details for %s: %s", movie_id, e)
         return jsonify({'error': 'HTTP error communicating with TMDB API'}), 502
     except requests.exceptions.RequestException as e:
-        print(f"ERROR: Request exception fetching movie details for ID {movie_id}: {str(e)}")
+        log.error("Request exception fetching movie details for %s: %s", movie_id, e)
         return jsonify({'error': 'Network error communicating with TMDB API'}), 502
     except Exception as e:
-        print(f"ERROR: Unexpected error fetching movie details for ID {movie_id}: {str(e)}")
-        print(f"ERROR: Exception type: {type(e).__name__}")
+        log.exception("Unexpected error fetching movie details for %s", movie_id)
         return jsonify({'error': 'Failed to fetch movie details'}), 500
 
 
+@app.route('/poster/<size>/<name>')
+def poster(size, name):
+    """Resized TMDB poster served from local disk, e.g. /poster/w500/kqjL17yufvn9OVLyXYpvtyrFfak.jpg"""
+    accepts_webp = 'image/webp' in request.headers.get('Accept', '')
+    try:
+        path, mimetype = posters.get(size, name, accepts_webp)
+    except PosterNotFound:
+        abort(404)
+    except PosterTimeout:
+        abort(504)
+    except PosterUnavailable:
+        abort(502)
+    response = send_file(path, mimetype=mimetype, etag=posters.etag(path), max_age=POSTER_MAX_AGE,
+                         conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
+
+@app.route('/movies')
+def get_movie_details_batch():
+    """Details for a whole calendar in one response, e.g. /movies?ids=155,27205"""
+    movie_ids = []
+    for raw_id in request.args.get('ids', '').split(','):
+        raw_id = raw_id.strip()
+        if raw_id.isdigit() and int(raw_id) not in movie_ids:
+            movie_ids.append(int(raw_id))
+    if not movie_ids:
+        return jsonify({'error': 'No movie ids provided'}), 400
+    if len(movie_ids) > MAX_DETAILS_BATCH:
+        return jsonify({'error': f'At most {MAX_DETAILS_BATCH} ids per request'}), 400
+
+    # Each id is served from the TMDB response cache when fresh, misses are fetched in parallel
+    responses = tmdb_client.get_many([f"/movie/{movie_id}" for movie_id in movie_ids], {"language": "en-US"})
+
+    movies = {}
+    missing = []
+    for movie_id, response in zip(movie_ids, responses):
+        if isinstance(response, Exception) or response.status_code != 200:
+            log.warning("Failed to fetch movie details for %s", movie_id)
+            missing.append(movie_id)
+            continue
+        movies[str(movie_id)] = format_movie_details(movie_id, response.json())
+
+    return revalidatable_json({'movies': movies, 'missing': missing})
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create missing tables and migrate legacy lists; run once per deploy (flask --app app init-db)"""
+    db.create_all()
+    log.info("Database tables created")
+    migrate_legacy_lists()
+    print("Database ready")
+
+
+def create_app():
+    """The app for production WSGI servers (see wsgi.py)
+
+    Runs in the gunicorn master, so it starts no threads: a thread running
+    while gunicorn forks can leave locks held in every worker. Workers start
+    the background services in gunicorn.conf.py's post_fork.
+    """
+    # Resolved before gunicorn forks, so workers start with every theme's keywords
+    keyword_registry.preload()
+    return app
+
+
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-        logging.info("Database tables created")
+    keyword_registry.start()
     port = int(os.environ.get('PORT', 5002))  # Changed default port to 5002
-    logging.info("About to start the server on host 0.0.0.0, port %s", port)
+    log.info("About to start the server on host 0.0.0.0, port %s", port)
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""Offline benchmark: drive the main routes against the TMDB stand-in
+
+    python -m bench.run                    # compare with bench/baseline.json, exit 1 on regression
+    python -m bench.run --update-baseline  # accept the current numbers
+
+Each scenario runs twice against a cold TMDB response cache: once for
+latency (p50/p95/p99) and upstream call counts, once under tracemalloc for
+peak memory. Everything the app writes goes to a temporary directory.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import unquote
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEED = 1234
+SERVICES = ["8", "9", "337"]
+
+CALENDAR_PAYLOADS = [
+    {"month": "October"},
+    {"month": "December"},
+    {"theme": "Movies", "category": "classics"},
+    {"month": "March", "year_from": "1990", "year_to": "2005"},
+    {"theme": "Summer", "category": "modern"},
+]
+SEARCH_QUERIES = ["alien", "christmas", "dark knight", "paddington", "scream", "toy story", "heat", "up"]
+
+# Allowed growth over the baseline before a number counts as a regression
+LATENCY_TOLERANCE = {"p50_ms": 0.5, "p95_ms": 0.5, "p99_ms": 1.0}  # p99 of a short run is close to the max
+LATENCY_FLOOR_MS = 10.0  # differences below this are timer and scheduling noise
+CALLS_TOLERANCE = 0.1
+MEMORY_TOLERANCE = 0.25
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def timed(samples, fn, *args, **kwargs):
+    started = time.perf_counter()
+    response = fn(*args, **kwargs)
+    samples.append((time.perf_counter() - started) * 1000)
+    if response.status_code >= 500:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    return response
+
+
+def calendar_payload(i):
+    return dict(CALENDAR_PAYLOADS[i % len(CALENDAR_PAYLOADS)], services=SERVICES)
+
+
+def scenario_get_movies(app, iterations):
+    client = app.test_client()
+    samples = []
+    for i in range(iterations):
+        timed(samples, client.post, "/get_movies", json=calendar_payload(i))
+    return samples
+
+
+def scenario_get_replacement_movie(app, iterations):
+    client = app.test_client()
+    payload = calendar_payload(0)
+    movies = client.post("/get_movies", json=payload).get_json()["movies"]
+    current_ids = [movie["id"] for movie in movies]
+    samples = []
+    for i in range(iterations):
+        response = timed(samples, client.post, "/get_replacement_movie", json=dict(payload, current_ids=current_ids))
+        movie = response.get_json().get("movie")
+        if movie:
+            current_ids[i % len(current_ids)] = movie["id"]
+    return samples
+
+
+def scenario_search_where_to_watch(app, iterations):
+    client = app.test_client()
+    samples = []
+    for i in range(iterations):
+        query = SEARCH_QUERIES[i % len(SEARCH_QUERIES)]
+        timed(samples, client.get, "/search_movies_where_to_watch", query_string={"query": query})
+    return samples
+
+
+def scenario_my_lists(app, iterations):
+    client = app.test_client()
+    username = f"bench{random.randrange(10 ** 9)}"
+    client.post("/register", data={"username": username, "password": "bench-password"})
+    movies = [{"id": i, "title": f"Movie {i}", "release_date": "2001-01-01", "poster_path": f"/p{i}.jpg",
+               "providers": ["Netflix"]} for i in range(31)]
+    for i in range(25):
+        client.post("/save_list", json={"name": f"List {i}", "movies": movies})
+
+    samples = []
+    cursor = None
+    for i in range(iterations):
+        page = timed(samples, client.get, "/my_lists", query_string={"before": cursor} if cursor else None)
+        html = page.get_data(as_text=True)
+        list_ids = re.findall(r'data-list-id="(\d+)"', html)
+        if list_ids:
+            timed(samples, client.get, f"/my_lists/{list_ids[0]}/items")
+        match = re.search(r'before=([^"&]+)', html)
+        cursor = unquote(match.group(1)) if match else None
+    return samples
+
+
+SCENARIOS = {
+    "get_movies": scenario_get_movies,
+    "get_replacement_movie": scenario_get_replacement_movie,
+    "search_movies_where_to_watch": scenario_search_where_to_watch,
+    "my_lists": scenario_my_lists,
+}
+
+
+def reset_state(app_module, standin):
+    """Cold TMDB cache and a fixed random sequence for every pass"""
+    # Reservoir refills and already-running page fetches from the last pass would refill the cache
+    standin.wait_until_quiet()
+    app_module.tmdb_cache.clear()
+    random.seed(SEED)
+
+
+def run_scenario(app_module, standin, name, iterations, memory_iterations):
+    scenario = SCENARIOS[name]
+
+    reset_state(app_module, standin)
+    standin.reset_counts()
+    samples = scenario(app_module.app, iterations)
+    calls = standin.call_counts()
+
+    reset_state(app_module, standin)
+    tracemalloc.start()
+    scenario(app_module.app, memory_iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "requests": len(samples),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "upstream_calls": sum(calls.values()),
+        "upstream_by_endpoint": calls,
+        "peak_kb": round(peak / 1024),
+    }
+
+
+def compare(results, baseline):
+    """Human-readable regressions of results against baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric, tolerance in LATENCY_TOLERANCE.items():
+            limit = max(previous[metric] * (1 + tolerance), previous[metric] + LATENCY_FLOOR_MS)
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {current[metric]} > {previous[metric]} (limit {limit:.2f})")
+        if current["upstream_calls"] > previous["upstream_calls"] * (1 + CALLS_TOLERANCE):
+            regressions.append(f"{name}: upstream_calls {current['upstream_calls']} > {previous['upstream_calls']}")
+        if current["peak_kb"] > previous["peak_kb"] * (1 + MEMORY_TOLERANCE):
+            regressions.append(f"{name}: peak_kb {current['peak_kb']} > {previous['peak_kb']}")
+    return regressions
+
+
+def configure_environment(workdir):
+    """Point every store at throwaway locations before any app module is imported"""
+    os.environ.update({
+        "TMDB_API_KEY": "bench",
+        "TMDB_CACHE_PATH": os.path.join(workdir, "tmdb_cache.db"),
+        "CATALOG_PATH": os.path.join(workdir, "catalog.db"),
+        "PRECOMPUTED_PATH": os.path.join(workdir, "precomputed.db"),
+        "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.db"),
+        "METRICS_PATH": os.path.join(workdir, "metrics.db"),
+        "KEYWORD_SEED_PATH": os.path.join(workdir, "keyword_seed.json"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'movie_advent.db')}",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "RANDOM_SEED": str(SEED),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark against a local TMDB stand-in")
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument("--memory-iterations", type=int, default=5)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Run only these scenarios (repeatable)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Stand-in response latency")
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--fixtures", help="Recorded responses keyed by normalized URL")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    configure_environment(tempfile.mkdtemp(prefix="movie-advent-bench-"))
+    # Imported only now: the stand-in pulls in tmdb_cache, which opens its database on import
+    from bench.tmdb_standin import TmdbStandIn, load_fixtures
+
+    standin = TmdbStandIn(fixtures=load_fixtures(args.fixtures) if args.fixtures else None,
+                          latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                          failure_rate=args.failure_rate, throttle_rate=args.throttle_rate, seed=SEED).start()
+    os.environ["TMDB_BASE_URL"] = standin.base_url
+
+    import app as app_module
+
+    app_module.app.config["TESTING"] = True
+    with app_module.app.app_context():
+        app_module.db.create_all()
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_scenario(app_module, standin, name, args.iterations, args.memory_iterations)
+        r = results[name]
+        print(f"{name:30} p50 {r['p50_ms']:8.2f}ms  p95 {r['p95_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  "
+              f"upstream {r['upstream_calls']:5}  peak {r['peak_kb']:7}KB")
+    standin.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f))
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
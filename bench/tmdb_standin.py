@@ -0,0 +1,276 @@
+"""Local stand-in for the TMDB API, for benchmarks and offline development
+
+Serves /discover/movie, /search/keyword, /search/movie, /movie/{id} and
+/movie/{id}/watch/providers under /3. Responses come from a fixtures file
+(normalized URL -> recorded response) or a cassette recorded with
+TMDB_CASSETTE_MODE=record when one is given, otherwise they are generated
+deterministically from the query so repeated runs see the same data.
+
+    python -m bench.tmdb_standin --port 8765 --latency-ms 80 --failure-rate 0.02
+    TMDB_BASE_URL=http://127.0.0.1:8765/3 python app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+from tmdb_cache import cache_key, endpoint_class
+from tmdb_cassette import load_interactions
+
+API_PREFIX = "/3"
+TOTAL_PAGES = 40
+PAGE_SIZE = 20
+MOVIE_ID_SPACE = 50000
+PROVIDERS = {8: "Netflix", 9: "Amazon Prime Video", 337: "Disney+", 531: "Paramount+", 350: "Apple TV+", 99: "Shudder"}
+GENRES = [28, 12, 16, 35, 80, 18, 10751, 14, 27, 9648, 10749, 878, 53]
+
+MOVIE_PATH = re.compile(r"^/movie/(\d+)$")
+PROVIDERS_PATH = re.compile(r"^/movie/(\d+)/watch/providers$")
+
+
+def load_fixtures(path):
+    """Fixtures from a JSON file {normalized url: {"status": 200, "body": ...}} or a TMDB cassette"""
+    if path.endswith(".gz"):
+        # Latest recording of each URL
+        return {key: entries[-1] for key, entries in load_interactions(path).items()}
+    with open(path) as f:
+        return json.load(f)
+
+
+class FixtureGenerator:
+    """Deterministic fake TMDB payloads; the same query always yields the same body"""
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.current_year = datetime.now().year
+
+    def _rng(self, *parts):
+        return random.Random(zlib.crc32(repr((self.seed, *parts)).encode()))
+
+    def movie(self, movie_id):
+        rng = self._rng("movie", movie_id)
+        year = rng.randint(1950, self.current_year + 1)
+        return {
+            "id": movie_id,
+            "title": f"Stand-in Movie {movie_id}",
+            "release_date": f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "poster_path": f"/poster{movie_id}.jpg",
+            "backdrop_path": f"/backdrop{movie_id}.jpg",
+            "overview": f"Overview of stand-in movie {movie_id}. " * rng.randint(1, 6),
+            "vote_average": round(rng.uniform(4, 9), 1),
+            "vote_count": rng.randint(50, 20000),
+            "popularity": round(rng.uniform(1, 500), 3),
+            "original_language": rng.choice(["en", "en", "en", "fr", "ja"]),
+            "genre_ids": rng.sample(GENRES, rng.randint(1, 3)),
+        }
+
+    def details(self, movie_id):
+        movie = self.movie(movie_id)
+        rng = self._rng("details", movie_id)
+        movie.update({
+            "runtime": rng.randint(70, 180),
+            "genres": [{"id": genre_id, "name": f"Genre {genre_id}"} for genre_id in movie.pop("genre_ids")],
+            "imdb_id": f"tt{movie_id:07d}",
+            "production_countries": [{"iso_3166_1": "GB", "name": "United Kingdom"}],
+            "tagline": "",
+            "status": "Released",
+        })
+        return movie
+
+    def discover(self, query):
+        page = int(query.get("page", 1))
+        # Results depend on the filters but not on sort order, like a fixed catalogue slice
+        filters = tuple(sorted((k, v) for k, v in query.items() if k not in ("page", "sort_by")))
+        rng = self._rng("discover", filters)
+        offset = rng.randrange(MOVIE_ID_SPACE)
+        step = rng.randrange(1, 97, 2)
+        # Release date bounds are honoured by moving each movie into the range, as a filtered query would
+        first = int(query.get("primary_release_date.gte", "1950")[:4])
+        last = int(query.get("primary_release_date.lte", str(self.current_year + 1))[:4])
+        results = []
+        if page <= TOTAL_PAGES and first <= last:
+            for i in range(PAGE_SIZE):
+                movie_id = 1 + (offset + ((page - 1) * PAGE_SIZE + i) * step) % MOVIE_ID_SPACE
+                movie = self.movie(movie_id)
+                year = int(movie["release_date"][:4])
+                if not first <= year <= last:
+                    movie["release_date"] = f"{first + year % (last - first + 1)}{movie['release_date'][4:]}"
+                results.append(movie)
+        return {"page": page, "results": results, "total_pages": TOTAL_PAGES,
+                "total_results": TOTAL_PAGES * PAGE_SIZE}
+
+    def search_keyword(self, query):
+        text = query.get("query", "")
+        return {"page": 1, "results": [{"id": zlib.crc32(text.encode()) % 300000, "name": text}],
+                "total_pages": 1, "total_results": 1}
+
+    def search_movie(self, query):
+        rng = self._rng("search", query.get("query", ""))
+        ids = rng.sample(range(1, MOVIE_ID_SPACE), PAGE_SIZE)
+        return {"page": 1, "results": [self.movie(movie_id) for movie_id in ids], "total_pages": 1,
+                "total_results": PAGE_SIZE}
+
+    def watch_providers(self, movie_id):
+        rng = self._rng("providers", movie_id)
+        flatrate = [{"provider_id": pid, "provider_name": name}
+                    for pid, name in PROVIDERS.items() if rng.random() < 0.35]
+        return {"id": movie_id, "results": {"GB": {"flatrate": flatrate}} if flatrate else {}}
+
+    def respond(self, path, query):
+        """(status, body) for an API path without the /3 prefix"""
+        if path == "/discover/movie":
+            return 200, self.discover(query)
+        if path == "/search/keyword":
+            return 200, self.search_keyword(query)
+        if path == "/search/movie":
+            return 200, self.search_movie(query)
+        match = PROVIDERS_PATH.match(path)
+        if match:
+            return 200, self.watch_providers(int(match.group(1)))
+        match = MOVIE_PATH.match(path)
+        if match:
+            return 200, self.details(int(match.group(1)))
+        return 404, {"success": False, "status_code": 34, "status_message": "The resource could not be found."}
+
+
+class TmdbStandIn:
+    """Threaded HTTP server imitating TMDB, with injectable latency and failures
+
+    latency_ms/jitter_ms delay every response; failure_rate answers that
+    fraction of requests with a 503 and throttle_rate with a 429 plus
+    Retry-After. Requests are counted per endpoint class in `calls`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, fixtures=None, latency_ms=0, jitter_ms=0,
+                 failure_rate=0.0, throttle_rate=0.0, seed=0):
+        self.fixtures = fixtures or {}
+        self.generator = FixtureGenerator(seed)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.calls = Counter()
+        self.last_request_at = 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                standin.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _roll(self):
+        with self._lock:
+            return self._rng.random(), self._rng.uniform(-1, 1)
+
+    def handle(self, request):
+        url = urlsplit(request.path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+        query = dict(parse_qsl(url.query))
+        with self._lock:
+            self.calls[endpoint_class(path)] += 1
+            self.last_request_at = time.monotonic()
+
+        roll, jitter = self._roll()
+        delay = max(self.latency_ms + jitter * self.jitter_ms, 0) / 1000
+        if delay:
+            time.sleep(delay)
+
+        headers = {}
+        if roll < self.failure_rate:
+            status, body = 503, {"status_code": 43, "status_message": "Stand-in injected failure"}
+        elif roll < self.failure_rate + self.throttle_rate:
+            status, body = 429, {"status_code": 25, "status_message": "Stand-in injected throttle"}
+            headers["Retry-After"] = "1"
+        else:
+            recorded = self.fixtures.get(cache_key(path, query))
+            if recorded is not None:
+                status, body = recorded.get("status", 200), recorded["body"]
+            else:
+                status, body = self.generator.respond(path, query)
+
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json;charset=utf-8")
+        request.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def wait_until_quiet(self, quiet=0.3, timeout=10):
+        """Block until no request has arrived for `quiet` seconds (background work has drained)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                idle = time.monotonic() - self.last_request_at
+            if idle >= quiet:
+                return True
+            time.sleep(quiet - idle)
+        return False
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def call_counts(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tmdb-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", help="JSON file of recorded responses keyed by normalized URL")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    standin = TmdbStandIn(args.host, args.port, load_fixtures(args.fixtures) if args.fixtures else None,
+                          args.latency_ms, args.jitter_ms, args.failure_rate, args.throttle_rate, args.seed)
+    print(f"TMDB stand-in listening on {standin.base_url}")
+    try:
+        standin._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PRECOMPUTED_PATH = os.environ.get(
+    'PRECOMPUTED_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'precomputed.db')
+)
+# Written nightly; a missed run still leaves a day of slack before calendars go live again
+PRECOMPUTED_MAX_AGE = float(os.environ.get('PRECOMPUTED_MAX_AGE', 36 * 60 * 60))
+
+
+class CalendarStore:
+    """Precomputed calendar candidate pools keyed by the /get_movies query key
+
+    Written by the batch generator in monthly_movie_list.py; /get_movies
+    samples a calendar from a fresh pool instead of crawling TMDB.
+    """
+
+    def __init__(self, path=PRECOMPUTED_PATH, max_age=PRECOMPUTED_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS calendar ("
+            " query_key TEXT PRIMARY KEY,"
+            " movies TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.commit()
+        # sqlite connections must not cross a fork (gunicorn --preload); children open their own
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    @staticmethod
+    def _key(query_key):
+        return json.dumps(list(query_key), separators=(",", ":"))
+
+    def get(self, query_key):
+        """The stored movie pool for a query, None when missing or older than max_age"""
+        row = self._conn().execute(
+            "SELECT movies FROM calendar WHERE query_key = ? AND created_at >= ?",
+            (self._key(query_key), time.time() - self.max_age)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_many(self, entries):
+        """Store (query_key, movies) pairs in one transaction"""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO calendar (query_key, movies, created_at) VALUES (?, ?, ?)",
+                [(self._key(key), json.dumps(movies, separators=(",", ":")), now) for key, movies in entries]
+            )
+
+    def prune(self):
+        """Drop pools too old to serve, returns how many"""
+        conn = self._conn()
+        with conn:
+            return conn.execute("DELETE FROM calendar WHERE created_at < ?",
+                                (time.time() - self.max_age,)).rowcount
+
+
+precomputed_calendars = CalendarStore()
@@ -0,0 +1,246 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import requests
+
+import tmdb_client
+from tmdb_scheduler import BACKGROUND
+
+log = logging.getLogger(__name__)
+
+CATALOG_PATH = os.environ.get(
+    'CATALOG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'catalog.db')
+)
+REGION = "GB"
+INGEST_PAGES = int(os.environ.get('CATALOG_INGEST_PAGES', 25))
+# Ingested nightly; past this, provider membership is too stale to build calendars from
+CATALOG_MAX_AGE = float(os.environ.get('CATALOG_MAX_AGE', 48 * 60 * 60))
+# The ingest runs in another process, so its timestamp is re-read this often
+INGEST_RECHECK_INTERVAL = 60
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS movie ("
+    " id INTEGER PRIMARY KEY,"
+    " title TEXT NOT NULL,"
+    " release_date TEXT,"
+    " release_year INTEGER NOT NULL,"
+    " vote_average REAL NOT NULL DEFAULT 0,"
+    " vote_count INTEGER NOT NULL DEFAULT 0,"
+    " popularity REAL NOT NULL DEFAULT 0,"
+    " original_language TEXT,"
+    " poster_path TEXT,"
+    " updated_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS movie_genre ("
+    " genre_id INTEGER NOT NULL,"
+    " movie_id INTEGER NOT NULL,"
+    " PRIMARY KEY (genre_id, movie_id))",
+    "CREATE TABLE IF NOT EXISTS movie_keyword ("
+    " keyword_id INTEGER NOT NULL,"
+    " movie_id INTEGER NOT NULL,"
+    " PRIMARY KEY (keyword_id, movie_id))",
+    "CREATE TABLE IF NOT EXISTS movie_provider ("
+    " provider_id INTEGER NOT NULL,"
+    " region TEXT NOT NULL,"
+    " movie_id INTEGER NOT NULL,"
+    " PRIMARY KEY (provider_id, region, movie_id))",
+    "CREATE TABLE IF NOT EXISTS meta ("
+    " key TEXT PRIMARY KEY,"
+    " value TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_movie_release_year ON movie (release_year)",
+    "CREATE INDEX IF NOT EXISTS ix_movie_popularity ON movie (popularity DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_movie_genre_movie ON movie_genre (movie_id)",
+    "CREATE INDEX IF NOT EXISTS ix_movie_keyword_movie ON movie_keyword (movie_id)",
+    "CREATE INDEX IF NOT EXISTS ix_movie_provider_movie ON movie_provider (movie_id)",
+]
+
+
+def release_year(movie):
+    year = (movie.get("release_date") or "1900")[:4]
+    try:
+        return int(year)
+    except ValueError:
+        return 1900
+
+
+class Catalog:
+    """Local copy of TMDB discover results, indexed for the calendar queries"""
+
+    def __init__(self, path=CATALOG_PATH, max_age=CATALOG_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        self._ingested_at = None
+        self._checked_at = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        # sqlite connections must not cross a fork (gunicorn --preload); children open their own
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def available(self):
+        """True when a complete ingestion run finished within max_age"""
+        now = time.time()
+        if self._ingested_at is None or now - self._checked_at > INGEST_RECHECK_INTERVAL:
+            self._ingested_at = self.ingested_at() or 0
+            self._checked_at = now
+        return now - self._ingested_at <= self.max_age
+
+    def ingested_at(self):
+        """When the last complete ingestion run finished, None if there never was one"""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'ingested_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def mark_ingested(self, conn):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ingested_at', ?)", (str(time.time()),))
+        self._ingested_at = None
+
+    def upsert_movies(self, conn, results, keyword_id=None, provider_id=None, region=REGION):
+        now = time.time()
+        for movie in results:
+            conn.execute(
+                "INSERT OR REPLACE INTO movie (id, title, release_date, release_year, vote_average,"
+                " vote_count, popularity, original_language, poster_path, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (movie["id"], movie["title"], movie.get("release_date"), release_year(movie),
+                 movie.get("vote_average", 0), movie.get("vote_count", 0), movie.get("popularity", 0),
+                 movie.get("original_language"), movie.get("poster_path"), now)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO movie_genre (genre_id, movie_id) VALUES (?, ?)",
+                [(genre_id, movie["id"]) for genre_id in movie.get("genre_ids", [])]
+            )
+            if keyword_id is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO movie_keyword (keyword_id, movie_id) VALUES (?, ?)",
+                    (keyword_id, movie["id"])
+                )
+            if provider_id is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO movie_provider (provider_id, region, movie_id) VALUES (?, ?, ?)",
+                    (provider_id, region, movie["id"])
+                )
+
+    def find_movies(self, services, keyword_ids=None, genre=None, year_min=None, year_max=None,
+                    min_votes=100, language=None, limit=100, region=REGION):
+        """Movies on any of the services matching the filters, most popular first"""
+        sql = [
+            "SELECT DISTINCT m.* FROM movie m",
+            "JOIN movie_provider p ON p.movie_id = m.id AND p.region = ?"
+            f" AND p.provider_id IN ({','.join('?' * len(services))})",
+        ]
+        args = [region, *[int(sid) for sid in services]]
+        if keyword_ids:
+            sql.append(f"JOIN movie_keyword k ON k.movie_id = m.id AND k.keyword_id IN ({','.join('?' * len(keyword_ids))})")
+            args.extend(keyword_ids)
+        if genre:
+            sql.append("JOIN movie_genre g ON g.movie_id = m.id AND g.genre_id = ?")
+            args.append(int(genre))
+        sql.append("WHERE m.vote_count >= ?")
+        args.append(min_votes)
+        if year_min is not None:
+            sql.append("AND m.release_year >= ?")
+            args.append(year_min)
+        if year_max is not None:
+            sql.append("AND m.release_year <= ?")
+            args.append(year_max)
+        if language:
+            sql.append("AND m.original_language = ?")
+            args.append(language)
+        sql.append("ORDER BY m.popularity DESC LIMIT ?")
+        args.append(limit)
+        rows = self._conn().execute(" ".join(sql), args).fetchall()
+        return [dict(row) for row in rows]
+
+
+def crawl(conn, catalog, params, pages, **tags):
+    """Copy up to `pages` discover pages for one keyword or provider into the catalog; False on a failed page"""
+    for page in range(1, pages + 1):
+        try:
+            response = tmdb_client.get("/discover/movie", dict(params, page=page), priority=BACKGROUND)
+        except requests.exceptions.RequestException as e:
+            log.warning("Catalog ingest request failed (%s, page %d): %s", tags, page, e)
+            return False
+        if response.status_code != 200:
+            log.warning("Catalog ingest discover error (%s, page %d): HTTP %s", tags, page, response.status_code)
+            return False
+        data = response.json()
+        catalog.upsert_movies(conn, data.get("results", []), **tags)
+        if page >= data.get("total_pages", 0):
+            break
+    return True
+
+
+def ingest(catalog, provider_ids, keyword_ids, pages=INGEST_PAGES):
+    """Refresh the provider and keyword membership tables from /discover/movie
+
+    The run only counts as an ingest, and so only extends how long the
+    catalog is served, when every provider was crawled in full. A provider
+    that fails keeps its previous membership.
+    """
+    base = {
+        "language": "en-US",
+        "region": REGION,
+        "sort_by": "popularity.desc",
+        "include_adult": "false",
+        "include_video": "false",
+        "vote_count.gte": 100,
+    }
+    conn = catalog._conn()
+    complete = True
+    for provider_id in provider_ids:
+        log.info("Ingesting provider %s", provider_id)
+        # Rebuilt from scratch so titles that left the service drop out
+        conn.execute("DELETE FROM movie_provider WHERE provider_id = ? AND region = ?", (provider_id, REGION))
+        if crawl(conn, catalog, dict(base, with_watch_providers=provider_id, watch_region=REGION), pages,
+                 provider_id=provider_id):
+            conn.commit()
+        else:
+            conn.rollback()
+            complete = False
+    for keyword_id in keyword_ids:
+        log.info("Ingesting keyword %s", keyword_id)
+        crawl(conn, catalog, dict(base, with_keywords=keyword_id), pages, keyword_id=keyword_id)
+        conn.commit()
+    if complete:
+        catalog.mark_ingested(conn)
+        conn.commit()
+    else:
+        log.warning("Catalog ingest incomplete; the catalog stays as old as the last complete run")
+    return complete
+
+
+catalog = Catalog()
+
+
+if __name__ == "__main__":
+    # Nightly job: python catalog.py ingest [pages]
+    if len(sys.argv) < 2 or sys.argv[1] != "ingest":
+        print("Usage: python catalog.py ingest [pages]")
+        sys.exit(1)
+    from app import UK_SERVICE_NAMES, KEYWORD_THEMES, keyword_registry
+
+    keyword_ids = sorted({kid for theme in KEYWORD_THEMES for kid in keyword_registry.get(theme)})
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else INGEST_PAGES
+    complete = ingest(catalog, list(UK_SERVICE_NAMES), keyword_ids, pages)
+    count = catalog._conn().execute("SELECT COUNT(*) FROM movie").fetchone()[0]
+    print(f"Catalog now holds {count} movies")
+    sys.exit(0 if complete else 1)
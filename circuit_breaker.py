@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+
+FAILURE_THRESHOLD = int(os.environ.get('TMDB_BREAKER_FAILURES', 5))
+OPEN_SECONDS = float(os.environ.get('TMDB_BREAKER_OPEN_SECONDS', 30))
+SLOW_CALL_SECONDS = float(os.environ.get('TMDB_BREAKER_SLOW_SECONDS', 5))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# allow_request() result for the one call let through while half-open
+PROBE = "probe"
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """The upstream is considered down and the call was not attempted"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker
+
+    Calls that raise, return 5xx or take longer than `slow_call` seconds
+    count as failures. After `failure_threshold` of them in a row the circuit
+    opens and allow_request() says no for `open_seconds`. After that a single
+    probe is let through (half-open); its outcome closes or re-opens the
+    circuit.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS, slow_call=SLOW_CALL_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.slow_call = slow_call
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """True, or PROBE for the half-open probe, when the call may go ahead; False otherwise"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return PROBE
+            return False
+
+    def ready(self):
+        """Would allow_request() let a call through right now (without claiming the probe)"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.open_seconds
+            return self.state == CLOSED or not self._probe_in_flight
+
+    def cancel(self):
+        """The probe (allow_request() returned PROBE) never reached the upstream; free its slot"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, ok, elapsed):
+        """Report a finished call; slow successes count as failures"""
+        ok = ok and elapsed <= self.slow_call
+        with self._lock:
+            self._probe_in_flight = False
+            if ok:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    log.warning("Circuit opened after %d consecutive failures", self.failures)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+            }
@@ -0,0 +1,46 @@
+"""gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app) so workers fork with
+the keyword registry already resolved and the modules already loaded.
+Nothing in the master may use the thread pools; threads don't survive the
+fork, and the modules that own them restart theirs in each worker.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2, 8)))
+# Threads per worker; calendar streams and job events each hold one while open
+worker_class = "gthread"
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so a slow leak can't grow without bound
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+
+def on_starting(server):
+    from app import shared_metrics
+
+    # Counters start from zero with the server, not from the last run's workers
+    shared_metrics.clear()
+
+
+def post_fork(server, worker):
+    from app import keyword_registry, shared_metrics
+    from tmdb_scheduler import scheduler, RATE_LIMIT, BURST
+
+    # Each worker has its own token bucket, so together they stay within one TMDB quota
+    scheduler.set_rate(RATE_LIMIT / server.cfg.workers, max(1, BURST // server.cfg.workers))
+    keyword_registry.start()
+    shared_metrics.start()
+
+
+def worker_exit(server, worker):
+    from app import shared_metrics
+
+    # Final counts, folded into the retired totals by the next scrape
+    shared_metrics.flush()
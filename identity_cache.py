@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+# Seconds a logged-in user is served from memory; also how long another worker process can
+# keep a user that was changed elsewhere, since invalidation only reaches this process
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+
+
+class CachedUser(UserMixin):
+    """What requests read from current_user, detached from any database session
+
+    One instance is shared by every thread serving the user, so treat it as
+    read-only; changes go through the User row, which invalidates it.
+    """
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+
+class IdentityCache:
+    """Logged-in users by id for a short TTL, so authenticated requests skip the user table"""
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user id -> (expires, CachedUser), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """The cached user, None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user):
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identities = IdentityCache()
@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get('CALENDAR_JOB_WORKERS', 4))
+MAX_PENDING_JOBS = int(os.environ.get('CALENDAR_MAX_PENDING_JOBS', 64))
+# Finished jobs, and so their results, are kept this long for pollers and repeat specs
+JOB_RESULT_TTL = float(os.environ.get('CALENDAR_JOB_RESULT_TTL', 10 * 60))
+# How often a job owned by another worker process is re-read while waiting on it
+SHARED_POLL_INTERVAL = 0.5
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Too many jobs are waiting for a worker"""
+
+
+def _freeze(value):
+    """Lists back to tuples after a JSON round trip, so shared job keys compare equal to local ones"""
+    return tuple(_freeze(item) for item in value) if isinstance(value, list) else value
+
+
+class Job:
+    """One background build; progress and state changes wake anyone in wait()"""
+
+    def __init__(self, key, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.state = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.version = 0  # bumped on every change, for wait()
+        self.on_change = on_change
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def _set(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+        if self.on_change:
+            self.on_change(self)
+
+    def update(self, **progress):
+        """Merge progress counters, e.g. job.update(pages=3, movies=40)"""
+        self._set(progress=dict(self.progress, **progress))
+
+    def wait(self, version, timeout):
+        """Block until the job changes past `version` or timeout; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_dict(self):
+        with self._changed:
+            return {"id": self.id, "state": self.state, "progress": dict(self.progress), "error": self.error}
+
+    def snapshot(self):
+        """Everything another process needs to answer for this job, JSON-ready"""
+        with self._changed:
+            return {"id": self.id, "key": self.key, "state": self.state, "progress": dict(self.progress),
+                    "result": self.result, "error": self.error, "version": self.version}
+
+
+class SharedJob:
+    """Read-only view of a job owned by another worker process, re-read from the shared store"""
+
+    def __init__(self, snapshot, shared):
+        self.shared = shared
+        self._load(snapshot)
+
+    def _load(self, snapshot):
+        self.id = snapshot["id"]
+        self.key = _freeze(snapshot["key"])
+        self.state = snapshot["state"]
+        self.progress = snapshot["progress"]
+        self.result = snapshot["result"]
+        self.error = snapshot["error"]
+        self.version = snapshot["version"]
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def wait(self, version, timeout):
+        deadline = time.monotonic() + timeout
+        while self.version == version and time.monotonic() < deadline:
+            time.sleep(SHARED_POLL_INTERVAL)
+            body = self.shared.get(f"job:{self.id}")
+            if body is None:
+                break  # expired, or the store was cleared; keep the last state seen
+            self._load(json.loads(body))
+        return self.version
+
+    def to_dict(self):
+        return {"id": self.id, "state": self.state, "progress": dict(self.progress), "error": self.error}
+
+
+class JobQueue:
+    """Bounded pool running jobs keyed by spec, with finished results kept for JOB_RESULT_TTL
+
+    Submitting a spec that is queued, running or recently finished returns
+    that job instead of starting another. With a `shared` store (get/set
+    with a TTL, like tmdb_cache.ResponseCache) every job is also published
+    there, so any worker process can report on it or reuse its result.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS, result_ttl=JOB_RESULT_TTL, shared=None):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.shared = shared
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calendar-job")
+        self._jobs = {}                 # id -> job
+        self._by_key = {}               # spec key -> latest job
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Job for `key`, starting fn(job, *args, **kwargs) on the pool when there is none to reuse"""
+        with self._lock:
+            self._expire()
+            job = self._by_key.get(key) or self._shared_job_for(key)
+            if job is not None and job.state != FAILED:
+                return job
+            if self.pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} calendar jobs already waiting")
+            job = Job(key, on_change=self._publish if self.shared is not None else None)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+        if self.shared is not None:
+            self._publish(job)
+            self.shared.set(f"jobspec:{json.dumps(key)}", job.id, self.result_ttl, endpoint="job")
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        if job is None and self.shared is not None:
+            body = self.shared.get(f"job:{job_id}")
+            job = SharedJob(json.loads(body), self.shared) if body else None
+        return job
+
+    def _shared_job_for(self, key):
+        if self.shared is None:
+            return None
+        job_id = self.shared.get(f"jobspec:{json.dumps(key)}")
+        body = self.shared.get(f"job:{job_id}") if job_id else None
+        return SharedJob(json.loads(body), self.shared) if body else None
+
+    def _publish(self, job):
+        self.shared.set(f"job:{job.id}", json.dumps(job.snapshot()), self.result_ttl, endpoint="job")
+
+    def pending(self):
+        """Jobs not yet finished; called with or without the lock"""
+        return sum(1 for job in list(self._jobs.values()) if not job.finished)
+
+    def _run(self, job, fn, args, kwargs):
+        job._set(state=RUNNING)
+        try:
+            result = fn(job, *args, **kwargs)
+        except Exception as e:
+            log.exception("Calendar job %s failed", job.id)
+            job._set(state=FAILED, error=str(e) or type(e).__name__, finished_at=time.monotonic())
+            return
+        job._set(state=DONE, result=result, finished_at=time.monotonic())
+
+    def _expire(self):
+        # Called with the lock held
+        cutoff = time.monotonic() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
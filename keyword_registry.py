@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+import tmdb_client
+from tmdb_scheduler import BACKGROUND
+
+log = logging.getLogger(__name__)
+
+SEED_PATH = os.environ.get(
+    'KEYWORD_SEED_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keyword_seed.json')
+)
+REFRESH_INTERVAL = int(os.environ.get('KEYWORD_REFRESH_SECONDS', 24 * 60 * 60))
+# After a refresh that couldn't reach TMDB for every theme
+RETRY_INTERVAL = int(os.environ.get('KEYWORD_RETRY_SECONDS', 5 * 60))
+
+# Themes that are resolved from a fixed list of keywords (first match of each)
+THEME_KEYWORD_QUERIES = {
+    "Halloween": ["halloween", "slasher", "scary", "paranormal", "jumpscare", "supernatural horror", "demonic"],
+    "Christmas": ["christmas", "holiday"],  # Using both christmas and holiday as requested
+}
+
+# Used when TMDB has no match, or can't be reached and the theme was never resolved
+FALLBACK_KEYWORD_IDS = {
+    "Halloween": [616],  # 616 is a fallback Halloween keyword ID
+    "Christmas": [207],  # 207 is a fallback Christmas keyword ID
+}
+
+
+def search_keyword(query):
+    """Return the keyword search results for a query, or None on failure"""
+    try:
+        response = tmdb_client.get("/search/keyword", {"query": query}, priority=BACKGROUND)
+    except requests.exceptions.RequestException as e:
+        log.warning("Failed to fetch keyword for %r: %s", query, e)
+        return None
+    if response.status_code != 200:
+        log.warning("Failed to fetch keyword for %r: HTTP %s", query, response.status_code)
+        return None
+    return response.json().get("results", [])
+
+
+def resolve_theme_keywords(theme):
+    """Look up the keyword IDs for a theme on TMDB, None when a lookup failed"""
+    if theme in THEME_KEYWORD_QUERIES:
+        keyword_ids = []
+        for kw in THEME_KEYWORD_QUERIES[theme]:
+            results = search_keyword(kw)
+            if results is None:
+                return None  # a partial list would quietly narrow the theme
+            if results:
+                # Take the first (most relevant) match
+                keyword_ids.append(results[0]["id"])
+            else:
+                log.info("No keyword found for %r", kw)
+        log.info("%s keywords found: %d IDs: %s", theme, len(keyword_ids), keyword_ids)
+        return keyword_ids or FALLBACK_KEYWORD_IDS.get(theme, [])
+
+    # For other themes, do a general keyword search and take the top 10
+    results = search_keyword(theme.lower())
+    if results is None:
+        return None
+    log.info("Fetched keywords for %s: %s", theme, [kw["name"] for kw in results[:10]])
+    return [kw["id"] for kw in results[:10]]
+
+
+class KeywordRegistry:
+    """Theme -> keyword ID lookup, resolved once and refreshed in the background"""
+
+    def __init__(self, themes, seed_path=SEED_PATH, refresh_interval=REFRESH_INTERVAL, retry_interval=RETRY_INTERVAL):
+        self.themes = list(dict.fromkeys(themes))
+        self.seed_path = seed_path
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.refreshed_at = 0
+        self._keywords = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        if seed_path and os.path.exists(seed_path):
+            self.load_seed(seed_path)
+
+    def load_seed(self, path):
+        with open(path) as f:
+            seed = json.load(f)
+        with self._lock:
+            self._keywords.update({theme: list(ids) for theme, ids in seed.get("themes", {}).items()})
+            self.refreshed_at = seed.get("refreshed_at", 0)
+        log.info("Loaded keyword seed for %d themes from %s", len(seed.get("themes", {})), path)
+
+    def save_seed(self, path=None):
+        path = path or self.seed_path
+        with self._lock:
+            seed = {"refreshed_at": self.refreshed_at, "themes": dict(self._keywords)}
+        with open(path, "w") as f:
+            json.dump(seed, f, indent=2, sort_keys=True)
+
+    def get(self, theme):
+        """Keyword IDs for one of the registry's themes, [] for any other theme
+
+        Only a theme not yet resolved touches the network. Themes come from
+        request bodies, so others are never looked up or kept.
+        """
+        if theme not in self.themes:
+            return []
+        with self._lock:
+            ids = self._keywords.get(theme)
+        if ids is None:
+            ids = resolve_theme_keywords(theme)
+            if ids is None:
+                # Not kept, so the next call or refresh asks TMDB again
+                return FALLBACK_KEYWORD_IDS.get(theme, [])
+            with self._lock:
+                self._keywords.setdefault(theme, ids)
+        return ids
+
+    def refresh(self):
+        """Re-resolve every theme; True when all succeeded. Themes that failed keep their IDs"""
+        failed = []
+        for theme in self.themes:
+            try:
+                ids = resolve_theme_keywords(theme)
+            except Exception:
+                log.exception("Keyword refresh failed for %s", theme)
+                ids = None
+            if ids is None:
+                failed.append(theme)
+                continue
+            with self._lock:
+                self._keywords[theme] = ids
+        if failed:
+            log.warning("Keyword refresh failed for %s; keeping their previous IDs", ", ".join(failed))
+            return False
+        self.refreshed_at = time.time()
+        return True
+
+    def _run(self):
+        while True:
+            wait = self.refreshed_at + self.refresh_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            if not self.refresh():
+                time.sleep(self.retry_interval)
+
+    def preload(self):
+        """Resolve every theme the seed didn't cover, in the calling thread"""
+        with self._lock:
+            missing = [theme for theme in self.themes if theme not in self._keywords]
+        for theme in missing:
+            self.get(theme)
+        with self._lock:
+            if missing and not self.refreshed_at and all(theme in self._keywords for theme in self.themes):
+                # Every theme was just looked up, so there's nothing for the first refresh to update;
+                # otherwise each forked worker would start by repeating all of these lookups
+                self.refreshed_at = time.time()
+
+    def start(self):
+        """Resolve every theme in a daemon thread and keep them fresh"""
+        # Also restarts the thread in a forked child, where the parent's is gone
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="keyword-registry", daemon=True)
+            self._thread.start()
+        return self._thread
+
+
+if __name__ == "__main__":
+    # Write a seed file so the app can start without network access
+    from app import KEYWORD_THEMES
+
+    registry = KeywordRegistry(KEYWORD_THEMES, seed_path=None)
+    if not registry.refresh():
+        raise SystemExit("TMDB lookups failed; seed not written")
+    registry.save_seed(SEED_PATH)
+    print(f"Wrote keyword seed to {SEED_PATH}")
@@ -0,0 +1,312 @@
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# Seconds; covers cache hits (sub-ms) up to a slow multi-page crawl
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Seconds between the snapshots each worker writes for SharedMetrics
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+log = logging.getLogger(__name__)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def samples(self, others=()):
+        """others: snapshot() series from other processes, added to this one's"""
+        with self._lock:
+            values = dict(self._values)
+        _add_series(values, others)
+        return [(f"{self.name}{_format_labels(self.labels, key)}", value) for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(values)] for key, values in self._series.items()]
+
+    def samples(self, others=()):
+        """others: snapshot() series from other processes, added to this one's"""
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        _add_series(series, others)
+        series = sorted(series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(bound)
+                lines.append((f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])}", cumulative))
+            lines.append((f"{self.name}_sum{_format_labels(self.labels, key)}", values[-1]))
+            lines.append((f"{self.name}_count{_format_labels(self.labels, key)}", cumulative))
+        return lines
+
+
+class Gauge:
+    """Value read from a callback when the metrics are scraped"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.read = read  # () -> number, or {label values tuple: number} when labelled
+
+    def samples(self, others=()):
+        # Read in the serving process only; a callback can't be summed across workers
+        value = self.read()
+        if not self.labels:
+            return [(self.name, value)]
+        return [(f"{self.name}{_format_labels(self.labels, key)}", v) for key, v in sorted(value.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read, labels=()):
+        return self.register(Gauge(name, help_text, read, labels))
+
+    def snapshot(self):
+        """Counter and histogram series by metric name, as JSON-ready lists"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return {metric.name: metric.snapshot() for metric in metrics if metric.kind != "gauge"}
+
+    def render(self, others=None):
+        """All metrics in the Prometheus text exposition format (0.0.4)
+
+        others is a snapshot() of other processes, e.g. from SharedMetrics,
+        added to this process's counters and histograms.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            samples = metric.samples((others or {}).get(metric.name, ()))
+            lines.extend(f"{name} {_format_value(value)}" for name, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+def _add_series(values, series):
+    """Add snapshot() series into a {label values: number or bucket list} dict, in place"""
+    for key, value in series:
+        key = tuple(key)
+        current = values.get(key)
+        if current is None:
+            values[key] = value
+        elif isinstance(current, list):
+            values[key] = [a + b for a, b in zip(current, value)]
+        else:
+            values[key] = current + value
+
+
+def merge_snapshots(*snapshots):
+    """One Registry.snapshot() holding the sums of several"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            _add_series(merged.setdefault(name, {}), series)
+    return {name: [[list(key), value] for key, value in values.items()] for name, values in merged.items()}
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """Every worker process's counters and histograms in one sqlite file, so a scrape sees them all
+
+    Once started, a worker writes its registry snapshot every `interval`
+    seconds and on exit; a scrape served by any worker adds the others'
+    latest snapshots to its own live values. Rows of workers that have
+    exited are folded into one "retired" row, so totals don't drop when
+    gunicorn recycles a worker. Gauges stay per serving worker. Until
+    start() is called nothing is shared and the file is never opened.
+    """
+
+    def __init__(self, path, registry, interval=METRICS_FLUSH_INTERVAL):
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self.worker = None  # this process's row, set by start()
+
+    def _connect(self):
+        # Short-lived connections: nothing to carry across the gunicorn fork
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("CREATE TABLE IF NOT EXISTS metric_snapshots ("
+                     " worker TEXT PRIMARY KEY, pid INTEGER NOT NULL, written_at REAL NOT NULL, data TEXT NOT NULL)")
+        return conn
+
+    def start(self):
+        """Share this process's metrics from now on; call once per worker, after the fork"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.worker = f"{os.getpid()}-{time.time():.6f}"  # pids are reused, worker rows must not be
+        threading.Thread(target=self._run, name="metrics-flush", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        if self.worker is None:
+            return
+        data = json.dumps(self.registry.snapshot(), separators=(",", ":"))
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO metric_snapshots (worker, pid, written_at, data)"
+                             " VALUES (?, ?, ?, ?)", (self.worker, os.getpid(), time.time(), data))
+        except sqlite3.Error as e:
+            log.warning("Could not write the metrics snapshot: %s", e)
+
+    def others(self):
+        """merge_snapshots() of every other worker, live or retired; None when not sharing"""
+        if self.worker is None:
+            return None
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("BEGIN IMMEDIATE")
+                rows = conn.execute("SELECT worker, pid, data FROM metric_snapshots WHERE worker != ?",
+                                    (self.worker,)).fetchall()
+                snapshots = {worker: json.loads(data) for worker, _, data in rows}
+                exited = [worker for worker, pid, _ in rows if worker != "retired" and not _alive(pid)]
+                if exited:
+                    retired = merge_snapshots(snapshots.pop("retired", {}), *(snapshots.pop(w) for w in exited))
+                    snapshots["retired"] = retired
+                    conn.execute("INSERT OR REPLACE INTO metric_snapshots (worker, pid, written_at, data)"
+                                 " VALUES ('retired', 0, ?, ?)", (time.time(), json.dumps(retired, separators=(",", ":"))))
+                    conn.executemany("DELETE FROM metric_snapshots WHERE worker = ?", [(w,) for w in exited])
+        except sqlite3.Error as e:
+            log.warning("Could not read other workers' metrics, serving this worker's only: %s", e)
+            return None
+        return merge_snapshots(*snapshots.values())
+
+    def clear(self):
+        """Forget every snapshot, e.g. when the server (re)starts"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM metric_snapshots")
+
+
+registry = Registry()
+
+# Outbound TMDB traffic, labelled with the tmdb_cache endpoint class
+tmdb_requests = registry.counter(
+    "tmdb_requests_total", "Requests sent to TMDB by endpoint and HTTP status", ("endpoint", "status"))
+tmdb_latency = registry.histogram(
+    "tmdb_request_duration_seconds", "Latency of requests sent to TMDB", ("endpoint",))
+tmdb_cache_lookups = registry.counter(
+    "tmdb_cache_lookups_total", "TMDB response cache lookups by endpoint and result (hit, miss, stale)",
+    ("endpoint", "result"))
+
+# Inbound traffic, labelled with the Flask route rule rather than the raw path
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "Latency of requests served by the app", ("route", "method", "status"))
+
+# Calendar building
+calendar_pages = registry.histogram(
+    "calendar_discover_pages", "TMDB discover pages consumed per calendar (0 when served from the catalog or a precomputed pool)",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50))
+calendar_candidates = registry.counter(
+    "calendar_candidates_total", "Discover results seen while building calendars, by outcome"
+    " (accepted, duplicate, excluded_title, future_release, category)", ("outcome",))
+calendars = registry.counter(
+    "calendars_total", "Calendars built, by whether they had enough movies (full, short)", ("result",))
+keyword_lookup_latency = registry.histogram(
+    "keyword_lookup_duration_seconds", "Time spent resolving a theme to keyword IDs")
+replacements = registry.counter(
+    "replacements_total", "Replacement movie requests by where the movie came from (reservoir, discover, none)",
+    ("source",))
+
+# Logged-in user lookups; a miss reads the user table
+user_cache_lookups = registry.counter(
+    "user_cache_lookups_total", "Identity cache lookups for logged-in users by result (hit, miss)", ("result",))
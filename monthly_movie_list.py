@@ -1,132 +1,131 @@
-import requests
-import random
-from calendar import monthrange
+"""Batch calendar generator: precompute /get_movies calendars for the nightly job
+
+    python monthly_movie_list.py                                   # every month x category, default services
+    python monthly_movie_list.py --months October December --categories classics \
+        --themes Halloween --services 8,9,337 --services 8 --workers 4
+
+Every month x theme x category x service set combination is built on a
+process pool with the same code /get_movies uses, and each pool of
+candidates is written to the precomputed calendar store, from which
+/get_movies samples a calendar without touching TMDB. --ndjson also writes
+one compact JSON line per calendar to a file.
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
-API_KEY = "0583fddd4f95815a08d57376fe8bd414"
-
-# Map months to seasonal themes
-MONTH_THEME_MAP = {
-    1: "Winter",
-    2: "Winter",
-    3: "Spring",
-    4: "Spring",
-    5: "Spring",
-    6: "Summer",
-    7: "Summer",
-    8: "Summer",
-    9: "Autumn",
-    10: "Halloween",
-    11: "Autumn",
-    12: "Christmas"
-}
-
-# List of popular UK streaming services (TMDb provider IDs)
-UK_SERVICES = {
-    8: "Netflix",
-    9: "Amazon Prime Video",
-    337: "Disney+",
-    2: "Apple TV",
-    3: "Google Play Movies",
-    68: "Microsoft Store"
-}
-
-def get_watch_providers(movie_id):
-    """
-    Fetch UK streaming providers for a given movie ID.
-    """
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/watch/providers?api_key={API_KEY}"
-    response = requests.get(url).json()
-    providers = response.get("results", {}).get("GB", {})
-    flatrate = providers.get("flatrate", [])
-    return [UK_SERVICES.get(provider["provider_id"], provider["provider_name"]) for provider in flatrate]
-
-def fetch_streaming_movies(theme, min_count, category="all"):
-    """
-    Fetch movies that are on UK streaming services for a given theme.
-    """
-    movies = []
-    seen_ids = set()
-    page = 1
-    current_year = datetime.now().year
-
-    while len(movies) < min_count and page <= 10:  # limit pages to avoid excessive API calls
-        url = f"https://api.themoviedb.org/3/search/movie?api_key={API_KEY}&query={theme}&page={page}&with_original_language=en"
-        response = requests.get(url).json()
-        results = response.get("results", [])
-        if not results:
-            break
-
-        for movie in results:
-            movie_id = movie["id"]
-            if movie_id in seen_ids:
-                continue
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+CATEGORIES = ["all", "modern", "classics"]
+THEMES = ["Halloween", "Christmas", "Winter", "Spring", "Summer", "Autumn", "Movies"]  # app.THEME_GENRE_MAP
+DEFAULT_SERVICES = "8,9,337"  # what the calendar form sends when nothing is changed
 
-            # Filter by category
-            year = movie.get("release_date", "1900")[:4]
-            try:
-                year = int(year)
-            except ValueError:
-                year = 1900
+# Candidates stored per calendar day, so each request can sample a different calendar
+POOL_FACTOR = int(os.environ.get('PRECOMPUTE_POOL_FACTOR', 2))
+
+log = logging.getLogger(__name__)
 
-            if category == "modern" and year < current_year - 10:
-                continue
-            if category == "classics" and year >= current_year - 20:
-                continue
 
-            # Check if available on UK streaming services
-            providers = get_watch_providers(movie_id)
-            if not providers:
-                continue  # skip if not on any UK service
+def combinations(months, themes, categories, service_sets):
+    """One /get_movies payload per month x theme x category x service set; theme "" is the month's own"""
+    for month, theme, category, services in itertools.product(months, themes, categories, service_sets):
+        yield {"month": month, "theme": theme, "category": category, "services": services}
 
-            movies.append({
-                "title": movie["title"],
-                "release_date": movie.get("release_date", "Unknown"),
-                "providers": providers
-            })
-            seen_ids.add(movie_id)
 
-            if len(movies) >= min_count:
-                break
+def init_worker(rate_limit, burst):
+    # Each process has its own TMDB scheduler, so the pool shares the rate limit and burst between them
+    os.environ["TMDB_RATE_LIMIT"] = str(rate_limit)
+    os.environ["TMDB_RATE_BURST"] = str(burst)
 
-        page += 1
 
-    random.shuffle(movies)
+def build_calendar(payload, pool_factor=POOL_FACTOR):
+    """(query key, candidate pool) for one payload, built exactly as /get_movies would"""
+    import app
 
-    # If not enough movies, repeat list to fill the month
-    while len(movies) < min_count:
-        movies.extend(movies)
+    category = payload["category"]
+    theme, min_count, _, genre = app.resolve_calendar_request(payload)
+    key = app.calendar_query_key(theme, min_count, category, genre, "", "", payload["services"])
+    movies = app.fetch_streaming_movies(theme, min_count * pool_factor, category, genre,
+                                        selected_services=payload["services"])
+    return key, min_count, movies
 
-    return movies[:min_count]
 
-def generate_monthly_streaming_list(month=None, category="all"):
-    if month is None:
-        month = datetime.now().month
+def generate(payloads, workers, pool_factor=POOL_FACTOR, ndjson=None):
+    """Build every payload on a process pool and store the full pools; returns (stored, short)"""
+    from calendar_store import precomputed_calendars
+
+    rate_limit = float(os.environ.get('TMDB_RATE_LIMIT', 40)) / workers
+    burst = max(1, int(os.environ.get('TMDB_RATE_BURST', 40)) // workers)
+    context = multiprocessing.get_context("spawn")  # workers import the app fresh, no inherited threads
+    stored = short = 0
+    entries = []
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                             initargs=(rate_limit, burst)) as pool:
+        futures = {pool.submit(build_calendar, payload, pool_factor): payload for payload in payloads}
+        for future in as_completed(futures):
+            payload = futures[future]
+            label = f"{payload['month']}/{payload['theme'] or '-'}/{payload['category']}/{','.join(payload['services'])}"
+            try:
+                key, min_count, movies = future.result()
+            except Exception:
+                log.exception("Calendar %s failed", label)
+                short += 1
+                continue
+            if len(movies) < min_count:
+                # Left to /get_movies, which explains a short calendar to the user
+                print(f"{label}: only {len(movies)} of {min_count} movies, not stored")
+                short += 1
+                continue
+            print(f"{label}: {len(movies)} movies")
+            entries.append((key, movies))
+            if ndjson:
+                ndjson.write(json.dumps({"key": key, "movies": movies}, separators=(",", ":")) + "\n")
+            stored += 1
+
+    precomputed_calendars.put_many(entries)
+    precomputed_calendars.prune()
+    return stored, short
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute calendars into the store /get_movies serves from")
+    parser.add_argument("--months", nargs="+", default=MONTHS, choices=MONTHS, metavar="MONTH")
+    parser.add_argument("--themes", nargs="+", default=[], choices=THEMES, metavar="THEME",
+                        help="Themes to build on top of each month's own theme")
+    parser.add_argument("--categories", nargs="+", default=CATEGORIES, choices=CATEGORIES)
+    parser.add_argument("--services", action="append",
+                        help=f"Comma-separated provider IDs, repeatable (default {DEFAULT_SERVICES})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pool-factor", type=int, default=POOL_FACTOR,
+                        help="Candidates stored per calendar day")
+    parser.add_argument("--ndjson", help="Also write each calendar as a JSON line to this file")
+    args = parser.parse_args()
+
+    service_sets = [s.split(",") for s in (args.services or [DEFAULT_SERVICES])]
+    payloads = list(combinations(args.months, ["", *args.themes], args.categories, service_sets))
+    print(f"Building {len(payloads)} calendars on {args.workers} workers "
+          f"({datetime.now().strftime('%Y-%m-%d %H:%M')})")
+
+    started = time.monotonic()
+    ndjson = open(args.ndjson, "w") if args.ndjson else None
+    try:
+        stored, short = generate(payloads, args.workers, args.pool_factor, ndjson)
+    finally:
+        if ndjson:
+            ndjson.close()
+    print(f"Stored {stored} calendars, {short} short or failed, in {time.monotonic() - started:.1f}s")
+    return 1 if stored == 0 and payloads else 0
 
-    days_in_month = monthrange(datetime.now().year, month)[1]
-    theme = MONTH_THEME_MAP.get(month, "Movies")
-    print(f"Generating {days_in_month}-day streaming movie list for {theme} ({datetime.now().strftime('%B')}) - Category: {category}\n")
-    return fetch_streaming_movies(theme, days_in_month, category)
 
 if __name__ == "__main__":
-    user_month = input("Enter month name (like 'October') or leave blank for current month: ").strip()
-    user_category = input("Choose category (modern, classics, all): ").strip().lower()
-
-    if user_month:
-        try:
-            month_number = datetime.strptime(user_month, "%B").month
-        except ValueError:
-            print("Invalid month name. Using current month instead.")
-            month_number = datetime.now().month
-    else:
-        month_number = datetime.now().month
-
-    if user_category not in ["modern", "classics", "all"]:
-        user_category = "all"
-
-    monthly_movies = generate_monthly_streaming_list(month_number, user_category)
-
-    print("Your UK streaming movie list for the month:\n")
-    for day, movie in enumerate(monthly_movies, 1):
-        print(f"Day {day}: {movie['title']} ({movie['release_date']})")
-        print(f"  Available on: {', '.join(movie['providers'])}\n")
+    from log_config import setup_logging
+
+    setup_logging()
+    sys.exit(main())
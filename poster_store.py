@@ -0,0 +1,205 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+
+import tmdb_client
+from singleflight import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it TMDB's own renditions are stored as-is
+    Image = None
+
+IMAGE_BASE_URL = os.environ.get('TMDB_IMAGE_BASE_URL', 'https://image.tmdb.org/t/p')
+POSTER_DIR = os.environ.get(
+    'POSTER_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'posters')
+)
+POSTER_MAX_BYTES = int(os.environ.get('POSTER_MAX_BYTES', 512 * 1024 * 1024))
+JPEG_QUALITY = int(os.environ.get('POSTER_JPEG_QUALITY', 82))
+WEBP_QUALITY = int(os.environ.get('POSTER_WEBP_QUALITY', 78))
+# Seconds a poster TMDB doesn't have, or failed to send, is answered from memory without asking again
+POSTER_MISS_TTL = float(os.environ.get('POSTER_MISS_TTL', 300))
+POSTER_FAILURE_TTL = float(os.environ.get('POSTER_FAILURE_TTL', 30))
+POSTER_FAILURES_MAX = 10000
+
+# Width in pixels of each size the pages ask for
+POSTER_WIDTHS = {"w200": 200, "w342": 342, "w500": 500, "w780": 780}
+# One TMDB rendition is fetched per poster and every local variant is cut from it
+SOURCE_SIZE = "w780"
+
+# TMDB file names are content hashes, e.g. /kqjL17yufvn9OVLyXYpvtyrFfak.jpg
+POSTER_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}\.(jpg|jpeg|png)$")
+
+MIMETYPES = {"webp": "image/webp", "jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png"}
+
+log = logging.getLogger(__name__)
+
+
+class PosterNotFound(Exception):
+    """Unknown size, malformed name, or TMDB has no such image"""
+
+
+class PosterUnavailable(Exception):
+    """TMDB could not be reached or answered with an error"""
+
+
+class PosterTimeout(PosterUnavailable):
+    """TMDB did not answer in time"""
+
+
+class PosterStore:
+    """Resized poster variants on local disk, fetched from TMDB at most once each
+
+    Files live under <root>/<size>/<name>.<ext>. When the directory grows past
+    max_bytes the least recently written files are removed. Downloads that
+    found nothing or failed are remembered for a short while and raise again
+    without another request.
+    """
+
+    def __init__(self, root=POSTER_DIR, max_bytes=POSTER_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self._etags = {}
+        self._failures = {}  # (size, name) -> (expires, exception class), oldest first
+
+    def path_for(self, size, name, fmt):
+        stem = name.rsplit(".", 1)[0]
+        return os.path.join(self.root, size, f"{stem}.{fmt}")
+
+    def output_format(self, name, accepts_webp):
+        if Image is None:
+            return name.rsplit(".", 1)[1]  # stored exactly as TMDB sent it
+        return "webp" if accepts_webp else "jpg"
+
+    def get(self, size, name, accepts_webp=False):
+        """(file path, mimetype) of the variant, creating it on first use"""
+        if size not in POSTER_WIDTHS or not POSTER_NAME.match(name):
+            raise PosterNotFound(f"{size}/{name}")
+        fmt = self.output_format(name, accepts_webp)
+        path = self.path_for(size, name, fmt)
+        if not os.path.exists(path):
+            self._flights.do(path, self._create, size, name, fmt, path)
+        return path, MIMETYPES[fmt]
+
+    def _create(self, size, name, fmt, path):
+        if os.path.exists(path):
+            return
+        if Image is None:
+            data = self._download(size, name)
+        else:
+            data = self._resize(self._source(name), POSTER_WIDTHS[size], fmt)
+        self._write(path, data)
+
+    def _download(self, size, name):
+        with self._lock:
+            failure = self._failures.get((size, name))
+        if failure is not None and failure[0] > time.monotonic():
+            raise failure[1](f"{size}/{name}")
+        try:
+            response = tmdb_client.session.get(f"{IMAGE_BASE_URL}/{size}/{name}", timeout=tmdb_client.DEFAULT_TIMEOUT)
+        except requests.exceptions.Timeout as e:
+            log.warning("Poster download timed out for %s/%s: %s", size, name, e)
+            raise self._remember_failure(size, name, PosterTimeout, POSTER_FAILURE_TTL) from e
+        except requests.exceptions.RequestException as e:
+            log.warning("Poster download failed for %s/%s: %s", size, name, e)
+            raise self._remember_failure(size, name, PosterUnavailable, POSTER_FAILURE_TTL) from e
+        if response.status_code == 404:
+            raise self._remember_failure(size, name, PosterNotFound, POSTER_MISS_TTL)
+        if response.status_code != 200:
+            log.warning("Poster download for %s/%s returned %s", size, name, response.status_code)
+            raise self._remember_failure(size, name, PosterUnavailable, POSTER_FAILURE_TTL)
+        return response.content
+
+    def _remember_failure(self, size, name, error_class, ttl):
+        """error_class for this download, noted so the next ttl seconds of requests get it at once"""
+        now = time.monotonic()
+        with self._lock:
+            self._failures.pop((size, name), None)
+            self._failures[(size, name)] = (now + ttl, error_class)
+            if len(self._failures) > POSTER_FAILURES_MAX:
+                self._failures = {key: entry for key, entry in self._failures.items() if entry[0] > now}
+                while len(self._failures) > POSTER_FAILURES_MAX:
+                    del self._failures[next(iter(self._failures))]
+        return error_class(f"{size}/{name}")
+
+    def _source(self, name):
+        """The SOURCE_SIZE rendition, kept so other sizes never go back to TMDB"""
+        path = os.path.join(self.root, "source", name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        data = self._download(SOURCE_SIZE, name)
+        self._write(path, data)
+        return data
+
+    def _resize(self, data, width, fmt):
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGB")
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            out = io.BytesIO()
+            if fmt == "webp":
+                image.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+            else:
+                image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            return out.getvalue()
+
+    def etag(self, path):
+        """Content hash of a stored variant, hashed once per process"""
+        etag = self._etags.get(path)
+        if etag is None:
+            with open(path, "rb") as f:
+                etag = self._etags[path] = hashlib.sha256(f.read()).hexdigest()[:32]
+        return etag
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._etags[path] = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._disk_usage()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(directory, name)
+
+    def _disk_usage(self):
+        return sum(os.path.getsize(path) for path in self._files())
+
+    def _evict(self):
+        # Called with the lock held; trims to 90% so eviction doesn't run on every write
+        files = sorted(((os.stat(path), path) for path in self._files()), key=lambda item: item[0].st_mtime)
+        target = self.max_bytes * 0.9
+        for stat, path in files:
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._etags.pop(path, None)
+            self._total_bytes -= stat.st_size
+        log.info("Poster store trimmed to %d bytes", self._total_bytes)
+
+
+posters = PosterStore()
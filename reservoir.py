@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+
+from tmdb_scheduler import BACKGROUND, INTERACTIVE
+
+MAX_RESERVOIRS = int(os.environ.get('MAX_RESERVOIRS', 2000))
+LOW_WATERMARK = int(os.environ.get('RESERVOIR_LOW_WATERMARK', 10))
+
+log = logging.getLogger(__name__)
+
+
+class CandidateReservoir:
+    """Ranked replacement candidates for one filter set, refilled page by page
+
+    `load_page(page, priority)` returns (movies, total_pages) with movies
+    already filtered and in rank order, or None when the page couldn't be
+    loaded. Candidates are popped from the front in O(1) and excluded by
+    movie id.
+    """
+
+    def __init__(self, load_page, executor=None, next_page=1, max_pages=50):
+        self.load_page = load_page
+        self.executor = executor
+        self.next_page = next_page
+        self.max_pages = max_pages
+        self.skip_pages = set()  # pages whose movies were already added, e.g. by a sampled calendar
+        self._candidates = deque()
+        self._seen_ids = set()
+        self._lock = threading.Lock()
+        self._refilled = threading.Condition(self._lock)
+        self._refilling = False
+
+    def __len__(self):
+        return len(self._candidates)
+
+    @property
+    def exhausted(self):
+        return self.next_page > self.max_pages
+
+    def add(self, movies, used_ids=()):
+        """Queue movies not seen before; used_ids are only marked as seen"""
+        with self._lock:
+            self._seen_ids.update(used_ids)
+            for movie in movies:
+                if movie["id"] not in self._seen_ids:
+                    self._seen_ids.add(movie["id"])
+                    self._candidates.append(movie)
+
+    def refill(self, priority=BACKGROUND):
+        """Load the next discover page into the reservoir; False when it couldn't be loaded"""
+        with self._lock:
+            while self.next_page in self.skip_pages:
+                self.next_page += 1
+            if self.exhausted:
+                return True
+            page = self.next_page
+            self.next_page += 1
+        try:
+            loaded = self.load_page(page, priority)
+        except Exception:
+            log.exception("Replacement page %d failed to load", page)
+            loaded = None
+        if loaded is None:
+            # A failed page says nothing about how many there are; try it again next time
+            with self._lock:
+                self.next_page = min(self.next_page, page)
+            return False
+        movies, total_pages = loaded
+        with self._lock:
+            self.max_pages = min(self.max_pages, total_pages)
+        self.add(movies)
+        return True
+
+    def _background_refill(self):
+        try:
+            self.refill()
+        finally:
+            with self._lock:
+                self._refilling = False
+                self._refilled.notify_all()
+
+    def pop(self, exclude_ids=(), exclude_titles=()):
+        """Next candidate not excluded, refilling from the next page if we run dry
+
+        None when the reservoir is exhausted or the page it needs failed to
+        load; a later pop tries that page again.
+        """
+        while True:
+            with self._lock:
+                while self._candidates:
+                    movie = self._candidates.popleft()
+                    if movie["id"] not in exclude_ids and movie["title"] not in exclude_titles:
+                        self._maybe_refill_later()
+                        return movie
+                if self._refilling:
+                    # The page being loaded in the background is the one we need; don't fetch another
+                    self._refilled.wait(timeout=15)
+                    continue
+            if self.exhausted:
+                return None
+            # Someone is waiting on this page, so it doesn't queue behind background crawls
+            if not self.refill(INTERACTIVE):
+                return None
+
+    def _maybe_refill_later(self):
+        # Called with the lock held
+        if (self.executor is not None and not self._refilling and not self.exhausted
+                and len(self._candidates) < LOW_WATERMARK):
+            self._refilling = True
+            self.executor.submit(self._background_refill)
+
+
+class ReservoirStore:
+    """Bounded LRU of reservoirs keyed on (session, filter set)"""
+
+    def __init__(self, max_entries=MAX_RESERVOIRS):
+        self.max_entries = max_entries
+        self._reservoirs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            reservoir = self._reservoirs.get(key)
+            if reservoir is not None:
+                self._reservoirs.move_to_end(key)
+            return reservoir
+
+    def put(self, key, reservoir):
+        with self._lock:
+            self._reservoirs[key] = reservoir
+            self._reservoirs.move_to_end(key)
+            while len(self._reservoirs) > self.max_entries:
+                self._reservoirs.popitem(last=False)
+        return reservoir
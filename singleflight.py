@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait for and share its result (or exception). Nothing
+    is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Returns (result, shared) where shared is True for callers that piggybacked"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+_EXHAUSTED = object()
+
+
+class _SharedStream:
+    def __init__(self, source):
+        self.source = source
+        self.items = []
+        self.done = False
+        self.error = None
+        self.producing = False
+        self.consumers = 0
+        self.changed = threading.Condition()
+
+
+class StreamFlight:
+    """SingleFlight for iterators: concurrent iterations of the same key share one source
+
+    The first caller for a key creates the source; callers arriving while it
+    is still being read get every item produced so far, then each new item
+    as it arrives. Whichever consumer needs the next item pulls it from the
+    source, so one consumer going away doesn't stall the others. Nothing is
+    kept once the source is exhausted, and a source every consumer abandoned
+    is closed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Returns (iterator, shared) where shared is True for callers that joined a running source"""
+        with self._lock:
+            stream = self._streams.get(key)
+            shared = stream is not None
+            if not shared:
+                stream = self._streams[key] = _SharedStream(iter(fn(*args, **kwargs)))
+            stream.consumers += 1
+        return self._consume(key, stream), shared
+
+    def _consume(self, key, stream):
+        position = 0
+        try:
+            while True:
+                produce = False
+                with stream.changed:
+                    while position == len(stream.items) and stream.producing:
+                        stream.changed.wait()
+                    if position < len(stream.items):
+                        item = stream.items[position]
+                    elif stream.done:
+                        if stream.error is not None:
+                            raise stream.error
+                        return
+                    else:
+                        stream.producing = produce = True
+                if produce:
+                    item = self._produce(key, stream)
+                    if item is _EXHAUSTED:
+                        return
+                position += 1
+                yield item
+        finally:
+            with self._lock:
+                stream.consumers -= 1
+                abandoned = stream.consumers == 0 and not stream.done
+                if abandoned and self._streams.get(key) is stream:
+                    del self._streams[key]
+            if abandoned and hasattr(stream.source, "close"):
+                stream.source.close()
+
+    def _produce(self, key, stream):
+        """Next item from the source, shared with every consumer; _EXHAUSTED at the end"""
+        try:
+            item = next(stream.source)
+        except BaseException as e:
+            with self._lock:
+                if self._streams.get(key) is stream:
+                    del self._streams[key]
+            with stream.changed:
+                stream.done = True
+                stream.error = None if isinstance(e, StopIteration) else e
+                stream.producing = False
+                stream.changed.notify_all()
+            if isinstance(e, StopIteration):
+                return _EXHAUSTED
+            raise
+        with stream.changed:
+            stream.items.append(item)
+            stream.producing = False
+            stream.changed.notify_all()
+        return item
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._streams)
+
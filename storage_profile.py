@@ -0,0 +1,99 @@
+"""Connection settings for the user/list database (SQLALCHEMY_DATABASE_URI)
+
+SQLite is the default store. STORAGE_PROFILE picks the PRAGMAs every new
+connection gets, and SQLITE_* variables override single values. Any other
+DATABASE_URL, e.g. postgresql://..., switches to a server database. That
+database uses the same pool settings and no PRAGMAs.
+"""
+import logging
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# PRAGMAs applied on connect; "stock" leaves the driver defaults (rollback journal, synchronous=FULL)
+STORAGE_PROFILES = {
+    "stock": {},
+    # WAL lets readers carry on while a list is written; NORMAL only syncs at checkpoints, so a
+    # power cut can lose the last commits but never corrupts the file
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,  # KiB when negative
+        "temp_store": "MEMORY",
+    },
+    # WAL concurrency with an fsync on every commit
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+    },
+}
+STORAGE_PROFILE = os.environ.get('STORAGE_PROFILE', 'tuned')
+PRAGMA_OVERRIDES = {
+    "journal_mode": os.environ.get('SQLITE_JOURNAL_MODE'),
+    "synchronous": os.environ.get('SQLITE_SYNCHRONOUS'),
+    "busy_timeout": os.environ.get('SQLITE_BUSY_TIMEOUT_MS'),
+    "mmap_size": os.environ.get('SQLITE_MMAP_SIZE'),
+    "cache_size": os.environ.get('SQLITE_CACHE_SIZE'),
+}
+
+# Pooled connections per worker process; one per gunicorn thread avoids waiting on the pool
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', os.environ.get('GUNICORN_THREADS', 8)))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 4))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+# Server databases drop idle connections; recycle before they do
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+log = logging.getLogger(__name__)
+
+
+def sqlite_pragmas(profile=STORAGE_PROFILE):
+    """PRAGMA name -> value for a profile, with SQLITE_* overrides applied"""
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown STORAGE_PROFILE {profile!r}, expected one of {', '.join(STORAGE_PROFILES)}")
+    pragmas = dict(STORAGE_PROFILES[profile])
+    pragmas.update((name, value) for name, value in PRAGMA_OVERRIDES.items() if value)
+    return pragmas
+
+
+def is_sqlite(url):
+    return url.startswith("sqlite")
+
+
+def engine_options(url, profile=STORAGE_PROFILE):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL"""
+    if not is_sqlite(url):
+        return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT,
+                "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": True}
+    options = {}
+    if ":memory:" not in url and url.rstrip("/") != "sqlite:":
+        # File databases get a QueuePool; in-memory ones keep SQLAlchemy's single shared connection
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    busy_timeout = sqlite_pragmas(profile).get("busy_timeout")
+    if busy_timeout:
+        # The driver's own lock wait, so it agrees with the PRAGMA
+        options["connect_args"] = {"timeout": int(busy_timeout) / 1000}
+    return options
+
+
+def install(profile=STORAGE_PROFILE):
+    """Apply the profile's PRAGMAs to every new sqlite connection; call before the engine connects"""
+    pragmas = sqlite_pragmas(profile)
+
+    @event.listens_for(Engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        if not pragmas or type(dbapi_connection).__module__ != "sqlite3":
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    log.info("Storage profile %s: %s", profile, pragmas or "driver defaults")
+    return pragmas
@@ -0,0 +1,6 @@
+import tempfile
+
+from bench.run import configure_environment
+
+# The app reads its settings on import; point every store at a throwaway directory first
+configure_environment(tempfile.mkdtemp(prefix="movie-advent-tests-"))
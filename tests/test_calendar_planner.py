@@ -0,0 +1,57 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app import decode_list_cursor, discover_params, encode_list_cursor, release_year_bounds
+
+
+@pytest.mark.parametrize("category, year_from, year_to, bounds", [
+    ("all", "", "", (None, 2026)),
+    ("all", "1990", "", (1990, 2026)),
+    ("all", "", "2005", (None, 2005)),
+    ("all", "1990", "2040", (1990, 2026)),  # nothing from the future
+    ("all", "abc", "", (None, 2026)),
+    ("modern", "", "", (2016, 2026)),
+    ("modern", "2020", "", (2020, 2026)),
+    ("classics", "", "", (None, 2005)),
+    ("classics", "1950", "2010", (1950, 2005)),
+])
+def test_release_year_bounds(category, year_from, year_to, bounds):
+    assert release_year_bounds(category, year_from, year_to, current_year=2026) == bounds
+
+
+@pytest.mark.parametrize("category, year_from, year_to", [
+    ("classics", "2015", ""),
+    ("modern", "", "2000"),
+    ("all", "2010", "2000"),
+])
+def test_release_year_bounds_empty(category, year_from, year_to):
+    assert release_year_bounds(category, year_from, year_to, current_year=2026) is None
+
+
+def test_discover_params_open_ended_range():
+    current_year = datetime.now().year
+    params = discover_params("Movies", ["8"], year_from="1990")
+    assert params["primary_release_date.gte"] == "1990-01-01"
+    assert params["primary_release_date.lte"] == f"{current_year}-12-31"
+
+    params = discover_params("Movies", ["8"], category="classics")
+    assert "primary_release_date.gte" not in params
+    assert params["primary_release_date.lte"] == f"{current_year - 21}-12-31"
+
+
+def test_discover_params_empty_range_sets_no_dates():
+    params = discover_params("Halloween", ["8"], year_from=str(datetime.now().year), category="classics",
+                             keyword_string="1|2")
+    assert "primary_release_date.gte" not in params and "primary_release_date.lte" not in params
+
+
+def test_list_cursor_round_trip():
+    movie_list = SimpleNamespace(created_at=datetime(2024, 10, 1, 12, 30, 5, 123456), id=42)
+    assert decode_list_cursor(encode_list_cursor(movie_list)) == (movie_list.created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", [None, "", "42", "not-a-date_42", "2024-10-01T12:30:05_x", "2024-10-01T12:30:05_"])
+def test_malformed_list_cursor(cursor):
+    assert decode_list_cursor(cursor) is None
@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+from metrics import Registry, SharedMetrics
+
+
+def worker_registry():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests", ("route",))
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    return registry, counter, histogram
+
+
+def test_scrapes_add_other_workers_snapshots(tmp_path):
+    path = str(tmp_path / "metrics.db")
+    first, first_requests, first_latency = worker_registry()
+    second, second_requests, second_latency = worker_registry()
+    first_requests.inc(route="/a")
+    first_latency.observe(0.05)
+    second_requests.inc(2, route="/a")
+    second_requests.inc(route="/b")
+    second_latency.observe(0.5)
+
+    shared = SharedMetrics(path, first)
+    shared.worker = "first"
+    other = SharedMetrics(path, second)
+    other.worker = "second"
+    other.flush()
+
+    text = first.render(shared.others())
+    assert 'requests_total{route="/a"} 3' in text
+    assert 'requests_total{route="/b"} 1' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_count 2' in text
+
+
+def test_exited_workers_are_kept_as_retired(tmp_path):
+    path = str(tmp_path / "metrics.db")
+    registry, _, _ = worker_registry()
+    exited, exited_requests, _ = worker_registry()
+    exited_requests.inc(5, route="/a")
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+
+    shared = SharedMetrics(path, registry)
+    shared.worker = "live"
+    gone = SharedMetrics(path, exited)
+    gone.worker = f"{child.pid}-0"
+    gone.flush()
+    with shared._connect() as conn:
+        conn.execute("UPDATE metric_snapshots SET pid = ?", (child.pid,))
+
+    assert 'requests_total{route="/a"} 5' in registry.render(shared.others())
+    with shared._connect() as conn:
+        assert [row[0] for row in conn.execute("SELECT worker FROM metric_snapshots")] == ["retired"]
+    assert 'requests_total{route="/a"} 5' in registry.render(shared.others())
@@ -0,0 +1,52 @@
+import pytest
+import requests
+
+import poster_store
+from poster_store import PosterNotFound, PosterStore, PosterTimeout, PosterUnavailable
+
+
+class FakeSession:
+    """session.get that answers from `outcomes` in turn and counts the calls"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, timeout):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response._content = b"poster"
+        return response
+
+
+@pytest.mark.parametrize("outcome, error", [
+    (404, PosterNotFound),
+    (503, PosterUnavailable),
+    (requests.exceptions.ConnectionError("refused"), PosterUnavailable),
+    (requests.exceptions.ReadTimeout("slow"), PosterTimeout),
+])
+def test_failed_downloads_are_remembered(tmp_path, monkeypatch, outcome, error):
+    session = FakeSession(outcome)
+    monkeypatch.setattr(poster_store.tmdb_client, "session", session)
+    store = PosterStore(str(tmp_path))
+
+    for _ in range(3):
+        with pytest.raises(error):
+            store._download("w780", "abc.jpg")
+    assert session.calls == 1
+
+
+def test_failures_are_retried_once_expired(tmp_path, monkeypatch):
+    session = FakeSession(503, 200)
+    monkeypatch.setattr(poster_store.tmdb_client, "session", session)
+    monkeypatch.setattr(poster_store, "POSTER_FAILURE_TTL", 0)
+    store = PosterStore(str(tmp_path))
+
+    with pytest.raises(PosterUnavailable):
+        store._download("w780", "abc.jpg")
+    assert store._download("w780", "abc.jpg") == b"poster"
+    assert session.calls == 2
@@ -0,0 +1,62 @@
+from reservoir import CandidateReservoir
+from tmdb_scheduler import BACKGROUND, INTERACTIVE
+
+
+def movie(movie_id):
+    return {"id": movie_id, "title": f"Movie {movie_id}"}
+
+
+class FlakyLoader:
+    """load_page that fails the pages listed in `failures` once each"""
+
+    def __init__(self, total_pages=3, failures=()):
+        self.total_pages = total_pages
+        self.failures = list(failures)
+        self.calls = []
+
+    def __call__(self, page, priority):
+        self.calls.append((page, priority))
+        if page in self.failures:
+            self.failures.remove(page)
+            return None
+        return [movie(page * 100 + i) for i in range(2)], self.total_pages
+
+
+def test_failed_page_is_retried_instead_of_exhausting():
+    loader = FlakyLoader(failures=[1])
+    reservoir = CandidateReservoir(loader)
+
+    assert reservoir.pop() is None
+    assert not reservoir.exhausted
+    assert reservoir.next_page == 1
+
+    assert reservoir.pop()["id"] == 100
+    assert [page for page, _ in loader.calls] == [1, 1]
+
+
+def test_failed_refill_keeps_max_pages():
+    reservoir = CandidateReservoir(FlakyLoader(total_pages=3, failures=[2]), next_page=2)
+
+    assert reservoir.refill() is False
+    assert reservoir.max_pages == 50
+    assert reservoir.refill() is True
+    assert reservoir.max_pages == 3
+    assert len(reservoir) == 2
+
+
+def test_loader_exception_counts_as_failure():
+    def load_page(page, priority):
+        raise OSError("disk full")
+
+    reservoir = CandidateReservoir(load_page)
+    assert reservoir.pop() is None
+    assert reservoir.next_page == 1 and not reservoir.exhausted
+
+
+def test_pop_refills_at_interactive_priority():
+    loader = FlakyLoader()
+    reservoir = CandidateReservoir(loader)
+
+    reservoir.pop()
+    reservoir.refill()
+    assert loader.calls == [(1, INTERACTIVE), (2, BACKGROUND)]
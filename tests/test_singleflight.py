@@ -0,0 +1,73 @@
+import threading
+
+from singleflight import StreamFlight
+
+
+def test_streams_joining_late_get_every_item():
+    flight = StreamFlight()
+    calls = []
+
+    def source():
+        calls.append(1)
+        yield from ([1], [2], [3])
+
+    first, shared = flight.do("k", source)
+    assert not shared and next(first) == [1]
+    second, shared = flight.do("k", source)
+    assert shared
+    assert list(second) == [[1], [2], [3]]
+    assert list(first) == [[2], [3]]
+    assert calls == [1] and flight.in_flight() == 0
+
+
+def test_other_streams_continue_when_one_goes_away():
+    flight = StreamFlight()
+    first, _ = flight.do("k", iter, [[1], [2]])
+    second, _ = flight.do("k", iter, [[1], [2]])
+    next(first)
+    first.close()
+    assert list(second) == [[1], [2]]
+
+
+def test_source_errors_reach_every_stream():
+    flight = StreamFlight()
+    release = threading.Event()
+
+    def source():
+        yield [1]
+        release.wait()
+        raise RuntimeError("upstream down")
+
+    streams = [flight.do("k", source)[0] for _ in range(2)]
+    errors = []
+
+    def drain(stream):
+        try:
+            list(stream)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=drain, args=(stream,)) for stream in streams]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 2 and flight.in_flight() == 0
+
+
+def test_abandoned_source_is_closed():
+    flight = StreamFlight()
+    closed = []
+
+    def source():
+        try:
+            yield [1]
+            yield [2]
+        finally:
+            closed.append(True)
+
+    stream, _ = flight.do("k", source)
+    next(stream)
+    stream.close()
+    assert closed and flight.in_flight() == 0
@@ -0,0 +1,53 @@
+import sqlite3
+
+import tmdb_cache
+from tmdb_cache import ResponseCache
+
+
+def test_hits_do_not_write_until_flushed(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=10)
+    cache.set("a", "body", 60)
+    before = cache._conn().execute("SELECT last_used FROM response_cache").fetchone()[0]
+
+    assert cache.get("a") == "body"
+    assert cache._conn().execute("SELECT last_used FROM response_cache").fetchone()[0] == before
+
+    cache._flush_touched()
+    assert cache._conn().execute("SELECT last_used FROM response_cache").fetchone()[0] > before
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(tmdb_cache, "TOUCH_FLUSH_KEYS", 1)
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=10)
+    for i in range(10):
+        cache.set(f"k{i}", "body", 60)
+    cache.get("k0")
+    cache.set("k10", "body", 60)
+
+    keys = {row[0] for row in cache._conn().execute("SELECT key FROM response_cache")}
+    assert len(keys) == 9  # trimmed to 90%
+    assert "k0" in keys and "k10" in keys and "k1" not in keys
+
+
+def test_locked_database_drops_the_write(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path)
+    cache._local.conn = sqlite3.connect(path, timeout=0)
+
+    blocker = sqlite3.connect(path)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        cache.set("b", "body", 60)  # "database is locked", dropped rather than raised
+    finally:
+        blocker.rollback()
+        blocker.close()
+    assert cache.get("b") is None
+
+
+def test_unreadable_database_is_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    cache.set("a", "body", 60)
+    cache._conn().close()
+
+    assert cache.get("a") is None
+    assert cache.get_stale("a") is None
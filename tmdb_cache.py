@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+CACHE_PATH = os.environ.get(
+    'TMDB_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'tmdb_cache.db')
+)
+if os.environ.get('TMDB_CASSETTE_MODE'):
+    # Cassette runs get a throwaway cache: recordings see every request the run makes, and
+    # replayed bodies never end up in the real cache
+    CACHE_PATH = os.path.join(tempfile.mkdtemp(prefix="tmdb-cassette-cache-"), "tmdb_cache.db")
+CACHE_MAX_ENTRIES = int(os.environ.get('TMDB_CACHE_MAX_ENTRIES', 20000))
+# Hits only note last_used in memory; the notes are written in one transaction this often,
+# or sooner once this many keys are waiting, so reads never take the write lock
+TOUCH_FLUSH_INTERVAL = 30
+TOUCH_FLUSH_KEYS = 500
+# The entry count is kept per process; recounted after this many writes to see other processes' rows
+RECOUNT_EVERY = 1000
+
+# TTL in seconds per endpoint class
+DAY = 24 * 60 * 60
+ENDPOINT_TTLS = {
+    "keyword": 7 * DAY,      # keyword IDs almost never change
+    "discover": 6 * 60 * 60,  # popularity ordering drifts through the day
+    "providers": DAY,         # streaming catalogues change daily at most
+    "details": DAY,
+    "search": 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+log = logging.getLogger(__name__)
+
+
+def endpoint_class(path):
+    """Classify a TMDB path so it gets the right TTL"""
+    if path.endswith("/search/keyword"):
+        return "keyword"
+    if path.endswith("/discover/movie"):
+        return "discover"
+    if path.endswith("/watch/providers"):
+        return "providers"
+    if path.endswith("/search/movie"):
+        return "search"
+    if "/movie/" in path:
+        return "details"
+    return "other"
+
+
+def cache_key(path, params=None):
+    """Normalize a request into a cache key: path plus sorted query, no api_key"""
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k != "api_key")
+    return f"{path}?{urlencode(items)}"
+
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response served from the cache"""
+
+    def __init__(self, status_code, text, headers=None, stale=False):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.from_cache = True
+        self.stale = stale
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ResponseCache:
+    """SQLite-backed response cache with per-entry TTL and LRU eviction
+
+    A cache that can't be read or written (e.g. "database is locked" under
+    load) behaves as a miss, never as an error for the caller.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._touched = {}  # key -> last_used not yet written
+        self._touched_flushed_at = time.monotonic()
+        self._entries = None  # estimated row count, None until first counted
+        self._writes_since_count = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " endpoint TEXT NOT NULL,"
+            " body TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_last_used ON response_cache (last_used)")
+        conn.commit()
+        # sqlite connections must not cross a fork (gunicorn --preload); children open their own
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _forget_connections(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._touched = {}
+
+    def get(self, key):
+        now = time.time()
+        try:
+            row = self._conn().execute(
+                "SELECT body, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning("Response cache read failed, treating as a miss: %s", e)
+            row = None
+        with self._lock:
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = now
+            flush = (len(self._touched) >= TOUCH_FLUSH_KEYS
+                     or time.monotonic() - self._touched_flushed_at >= TOUCH_FLUSH_INTERVAL)
+        if flush:
+            self._flush_touched()
+        return row[0]
+
+    def _take_touched(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touched_flushed_at = time.monotonic()
+        return touched
+
+    def _flush_touched(self):
+        touched = self._take_touched()
+        if not touched:
+            return
+        conn = self._conn()
+        try:
+            with conn:
+                self._write_touched(conn, touched)
+        except sqlite3.Error as e:
+            # Only LRU order is lost; another flush will try again with newer times
+            log.warning("Response cache last_used update failed: %s", e)
+
+    @staticmethod
+    def _write_touched(conn, touched):
+        conn.executemany("UPDATE response_cache SET last_used = ? WHERE key = ?",
+                         [(used, key) for key, used in touched.items()])
+
+    def get_stale(self, key):
+        """Last stored body for key even if its TTL has run out (kept until LRU eviction)"""
+        try:
+            row = self._conn().execute("SELECT body FROM response_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            log.warning("Response cache read failed, treating as a miss: %s", e)
+            return None
+        return row[0] if row else None
+
+    def set(self, key, body, ttl, endpoint="other"):
+        """Store a body; a write that fails is dropped, the cache just misses later"""
+        now = time.time()
+        conn = self._conn()
+        touched = self._take_touched()  # rides along in this write transaction
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, endpoint, body, expires_at, last_used)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, endpoint, body, now + ttl, now)
+                )
+                if touched:
+                    self._write_touched(conn, touched)
+                self._evict(conn)
+        except sqlite3.Error as e:
+            log.warning("Response cache write failed for %s: %s", key, e)
+
+    def _evict(self, conn):
+        # Replacing a key counts as a new row here, so the estimate only ever runs high;
+        # an exact COUNT(*) settles it before anything is deleted
+        with self._lock:
+            self._writes_since_count += 1
+            if self._entries is not None:
+                self._entries += 1
+            recount = (self._entries is None or self._entries > self.max_entries
+                       or self._writes_since_count >= RECOUNT_EVERY)
+        if not recount:
+            return
+        count = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            # Down to 90%, so a full cache isn't recounted on every write
+            overflow += self.max_entries // 10
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                " SELECT key FROM response_cache ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            count -= overflow
+        with self._lock:
+            self._entries = count
+            self._writes_since_count = 0
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM response_cache")
+        conn.commit()
+        with self._lock:
+            self._touched = {}
+            self._entries = 0
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        entries = self._conn().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+
+cache = ResponseCache()
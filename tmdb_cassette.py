@@ -0,0 +1,97 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+RECORD = "record"
+REPLAY = "replay"            # sleep for each interaction's original duration
+REPLAY_FAST = "replay-fast"  # answer immediately
+MODES = (RECORD, REPLAY, REPLAY_FAST)
+
+# Only headers the app actually reads are kept on the cassette
+KEPT_HEADERS = ("Content-Type", "Retry-After")
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """A replayed request has no recorded interaction"""
+
+
+class ReplayedResponse:
+    """The parts of requests.Response the app uses, rebuilt from a cassette entry"""
+
+    def __init__(self, status_code, text, headers=None, elapsed=0.0):
+        self.status_code = status_code
+        self.text = text
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.elapsed = timedelta(seconds=elapsed)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class Cassette:
+    """TMDB interactions on disk as gzipped JSON lines, keyed by normalized URL
+
+    Each line is {"key", "status", "elapsed", "headers", "body"}; the key is
+    tmdb_cache.cache_key(), so the API key never reaches the file. A key
+    recorded several times is replayed in recording order, and its last
+    interaction repeats once they run out.
+    """
+
+    def __init__(self, path, mode):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self._interactions = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        if mode != RECORD:
+            self._interactions = load_interactions(path)
+
+    def record(self, key, response, elapsed):
+        entry = {
+            "key": key,
+            "status": response.status_code,
+            "elapsed": round(elapsed, 4),
+            "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            "body": response.text,
+        }
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Every append is its own gzip member; gzip.open reads them back as one stream
+            with gzip.open(self.path, "ab") as f:
+                f.write(line)
+
+    def replay(self, key):
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise CassetteMiss(f"No recorded TMDB interaction for {key}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            entry = interactions[min(position, len(interactions) - 1)]
+        if self.mode == REPLAY and entry["elapsed"]:
+            time.sleep(entry["elapsed"])
+        return ReplayedResponse(entry["status"], entry["body"], entry["headers"], entry["elapsed"])
+
+    def rewind(self):
+        with self._lock:
+            self._positions.clear()
+
+
+def load_interactions(path):
+    """{key: [entry, ...]} in recording order"""
+    interactions = {}
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                interactions.setdefault(entry["key"], []).append(entry)
+    return interactions
@@ -0,0 +1,327 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from tmdb_cache import cache, cache_key, endpoint_class, CachedResponse, ENDPOINT_TTLS, DEFAULT_TTL
+from tmdb_scheduler import scheduler, retry_after_seconds, SchedulerTimeout, INTERACTIVE, CRAWL, BACKGROUND
+from circuit_breaker import PROBE, CircuitBreaker, CircuitOpenError
+from metrics import tmdb_requests, tmdb_latency, tmdb_cache_lookups
+from tmdb_cassette import Cassette, RECORD, REPLAY_FAST
+from singleflight import SingleFlight
+
+API_KEY = os.environ.get('TMDB_API_KEY', '0583fddd4f95815a08d57376fe8bd414')
+BASE_URL = os.environ.get('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+# record: save every TMDB interaction; replay / replay-fast: answer from the cassette only
+CASSETTE_MODE = os.environ.get('TMDB_CASSETTE_MODE', '')
+CASSETTE_PATH = os.environ.get(
+    'TMDB_CASSETTE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'tmdb_cassette.jsonl.gz')
+)
+
+# (connect, read) timeouts in seconds, used unless a call passes its own
+DEFAULT_TIMEOUT = (3.05, 10)
+POOL_SIZE = int(os.environ.get('TMDB_POOL_SIZE', 32))
+MAX_RETRIES = int(os.environ.get('TMDB_MAX_RETRIES', 3))
+MAX_THROTTLE_RETRIES = int(os.environ.get('TMDB_MAX_THROTTLE_RETRIES', 5))
+LOOKUP_WORKERS = int(os.environ.get('TMDB_LOOKUP_WORKERS', 8))
+
+log = logging.getLogger(__name__)
+
+
+def build_session():
+    """requests.Session with a keep-alive connection pool and bounded retries"""
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=0.5,  # 0.5s, 1s, 2s between attempts
+        status_forcelist=(500, 502, 503, 504),  # 429 goes back through the scheduler
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # hand the last response back to the caller
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = build_session()
+breaker = CircuitBreaker()
+cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE) if CASSETTE_MODE else None
+# replay-fast answers from disk at once, so holding it to TMDB's rate limit only slows the run
+rate_limited = cassette is None or cassette.mode != REPLAY_FAST
+# Identical cacheable GETs in flight at the same time share one upstream call
+upstream_flights = SingleFlight()
+
+# Set per request by begin_request(); flipped when a stale response is served
+_stale_flag = contextvars.ContextVar("tmdb_stale_flag", default=None)
+# Queries served stale, refreshed once the circuit lets calls through again
+_pending_refresh = {}
+_refresh_lock = threading.Lock()
+_refresher = None
+
+
+def build_params(params=None):
+    """Query parameters for a TMDB call: api_key added, empty values dropped, lists pipe-joined"""
+    query = {"api_key": API_KEY}
+    for key, value in (params or {}).items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = "|".join(map(str, value))
+        query[key] = value
+    return query
+
+
+def begin_request():
+    """Start tracking whether anything served in this context was stale"""
+    _stale_flag.set({"stale": False})
+
+
+def served_stale():
+    flag = _stale_flag.get()
+    return bool(flag and flag["stale"])
+
+
+def _mark_stale():
+    flag = _stale_flag.get()
+    if flag is not None:
+        flag["stale"] = True
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's context (stale tracking) into the worker"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def serve_stale(path, params, key, priority):
+    """Last known good response for key, queuing a refresh for when TMDB is back"""
+    body = cache.get_stale(key)
+    if body is None:
+        return None
+    _mark_stale()
+    tmdb_cache_lookups.inc(endpoint=endpoint_class(path), result="stale")
+    with _refresh_lock:
+        _pending_refresh.setdefault(key, (path, params, priority))
+    _start_refresher()
+    return CachedResponse(200, body, stale=True)
+
+
+def send(path, query, key, timeout):
+    """One HTTP round trip to TMDB, or its cassette recording/replay"""
+    if cassette is not None and cassette.mode != RECORD:
+        return cassette.replay(key)
+    started = time.monotonic()
+    response = session.get(f"{BASE_URL}{path}", params=query, timeout=timeout)
+    if cassette is not None:
+        cassette.record(key, response, time.monotonic() - started)
+    return response
+
+
+def get(path, params=None, timeout=DEFAULT_TIMEOUT, use_cache=True, priority=CRAWL):
+    """GET a TMDB API path, e.g. get("/movie/155", {"language": "en-US"})
+
+    Successful responses are stored in the response cache and served from it
+    until their endpoint TTL runs out. Every upstream request waits for a slot
+    from the rate scheduler; a 429 pauses the scheduler for Retry-After and the
+    request is queued again instead of failing.
+
+    Calls go through a circuit breaker. While it is open, or when a call
+    fails, the last known good response for the same query is returned with
+    stale=True and refreshed in the background once the circuit half-opens.
+    """
+    query = build_params(params)
+    key = cache_key(path, query)
+    endpoint = endpoint_class(path)
+    if not use_cache:
+        return fetch(path, params, query, key, endpoint, timeout, use_cache, priority)
+
+    body = cache.get(key)
+    tmdb_cache_lookups.inc(endpoint=endpoint, result="miss" if body is None else "hit")
+    if body is not None:
+        return CachedResponse(200, body)
+    response, shared = upstream_flights.do(key, fetch, path, params, query, key, endpoint, timeout, use_cache, priority)
+    if shared and getattr(response, "stale", False):
+        _mark_stale()
+    return response
+
+
+def fetch(path, params, query, key, endpoint, timeout, use_cache, priority):
+    """The upstream half of get(): breaker, rate scheduler, stale fallback, cache fill"""
+    allowed = breaker.allow_request()
+    if not allowed:
+        stale = serve_stale(path, params, key, priority) if use_cache else None
+        if stale is not None:
+            return stale
+        raise CircuitOpenError(f"TMDB circuit is open, not calling {path}")
+
+    started = time.monotonic()
+    try:
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            if rate_limited:
+                scheduler.acquire(priority)
+            started = time.monotonic()  # time TMDB, not our own queue
+            response = send(path, query, key, timeout)
+            if response.status_code != 429:
+                break
+            scheduler.pause(retry_after_seconds(response))
+    except SchedulerTimeout:
+        # Our own queue was the bottleneck, this says nothing about TMDB
+        if allowed is PROBE:
+            breaker.cancel()
+        raise
+    except requests.exceptions.RequestException:
+        elapsed = time.monotonic() - started
+        breaker.record(False, elapsed)
+        tmdb_requests.inc(endpoint=endpoint, status="error")
+        tmdb_latency.observe(elapsed, endpoint=endpoint)
+        stale = serve_stale(path, params, key, priority) if use_cache else None
+        if stale is not None:
+            return stale
+        raise
+    except Exception:
+        # A fault on our side, e.g. a cassette that can't be written; release a half-open probe
+        # or the breaker would wait on it forever
+        if allowed is PROBE:
+            breaker.cancel()
+        raise
+
+    elapsed = time.monotonic() - started
+    breaker.record(response.status_code < 500, elapsed)
+    tmdb_requests.inc(endpoint=endpoint, status=response.status_code)
+    tmdb_latency.observe(elapsed, endpoint=endpoint)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("TMDB %s -> %s", path, response.status_code,
+                  extra={"endpoint": endpoint, "elapsed_ms": round(elapsed * 1000, 1)})
+    if response.status_code >= 500 and use_cache:
+        stale = serve_stale(path, params, key, priority)
+        if stale is not None:
+            return stale
+
+    if use_cache and response.status_code == 200:
+        cache.set(key, response.text, ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL), endpoint)
+    return response
+
+
+def _refresh_loop():
+    global _refresher
+    try:
+        while True:
+            time.sleep(1)
+            with _refresh_lock:
+                pending = list(_pending_refresh.items())
+            for key, (path, params, priority) in pending:
+                if not breaker.ready():
+                    break
+                with _refresh_lock:
+                    _pending_refresh.pop(key, None)
+                try:
+                    get(path, params, priority=BACKGROUND)
+                except requests.exceptions.RequestException as e:
+                    log.warning("Background refresh of %s failed: %s", path, e)
+                except Exception:
+                    log.exception("Background refresh of %s failed", path)
+    finally:
+        # Whatever stopped the loop, let the next stale serve start a new one
+        with _refresh_lock:
+            _refresher = None
+
+
+def _reset_after_fork():
+    # Threads don't survive a fork (gunicorn --preload); let the child start its own refresher.
+    # Keep-alive sockets opened in the parent would be shared with every sibling, so the child
+    # gets its own pool; the parent's is left alone, not closed, as the parent still owns it
+    global _refresher, _refresh_lock, session
+    _refresh_lock = threading.Lock()
+    _refresher = None
+    session = build_session()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _start_refresher():
+    global _refresher
+    with _refresh_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="tmdb-refresh", daemon=True)
+            _refresher.start()
+
+
+# Fan-out pool for per-movie lookups (providers, details)
+lookup_pool = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS)
+
+
+def get_many(paths, params=None):
+    """get() for several paths concurrently; exceptions are returned in place of responses"""
+    def fetch(path):
+        try:
+            return get(path, params, priority=INTERACTIVE)
+        except requests.exceptions.RequestException as e:
+            return e
+
+    return [future.result() for future in [submit(lookup_pool, fetch, path) for path in paths]]
+
+
+def provider_cache_key(movie_id, region):
+    return f"providers:{movie_id}:{region}"
+
+
+def fetch_watch_providers(movie_id, region="GB"):
+    """Ask TMDB for a movie's providers and cache the region's slice
+
+    Falls back to the last cached slice, marked stale, when TMDB can't answer.
+    """
+    key = provider_cache_key(movie_id, region)
+    try:
+        response = get(f"/movie/{movie_id}/watch/providers", use_cache=False, priority=INTERACTIVE)
+    except requests.exceptions.RequestException as e:
+        log.warning("Watch providers request failed for movie %s: %s", movie_id, e)
+        response = None
+    if response is None or response.status_code != 200:
+        stale = cache.get_stale(key)
+        if stale is None:
+            return None
+        _mark_stale()
+        tmdb_cache_lookups.inc(endpoint="providers", result="stale")
+        return json.loads(stale)
+    providers = response.json().get("results", {}).get(region, {})
+    cache.set(key, json.dumps(providers), ENDPOINT_TTLS["providers"], "providers")
+    return providers
+
+
+def get_watch_providers(movie_id, region="GB"):
+    """Watch providers for one movie in one region, cached per (movie, region) for a day
+
+    Returns the region's provider dict ({"flatrate": [...], ...}), {} when the
+    movie isn't available there, or None when TMDB couldn't be asked.
+    """
+    body = cache.get(provider_cache_key(movie_id, region))
+    tmdb_cache_lookups.inc(endpoint="providers", result="miss" if body is None else "hit")
+    if body is not None:
+        return json.loads(body)
+    return fetch_watch_providers(movie_id, region)
+
+
+def get_watch_providers_many(movie_ids, region="GB"):
+    """get_watch_providers for several movies; cache misses are fetched concurrently"""
+    providers = {}
+    misses = []
+    for movie_id in movie_ids:
+        body = cache.get(provider_cache_key(movie_id, region))
+        tmdb_cache_lookups.inc(endpoint="providers", result="miss" if body is None else "hit")
+        if body is not None:
+            providers[movie_id] = json.loads(body)
+        else:
+            misses.append(movie_id)
+    futures = {movie_id: submit(lookup_pool, fetch_watch_providers, movie_id, region) for movie_id in misses}
+    providers.update({movie_id: future.result() for movie_id, future in futures.items()})
+    return providers
@@ -0,0 +1,118 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import requests
+
+# Lower number goes first
+INTERACTIVE = 0  # search, details, providers: a user is waiting on this one call
+CRAWL = 1        # discover pages for a calendar being built
+BACKGROUND = 2   # keyword refresh, catalog ingest, reservoir refills
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", CRAWL: "crawl", BACKGROUND: "background"}
+
+RATE_LIMIT = float(os.environ.get('TMDB_RATE_LIMIT', 40))  # requests per second
+BURST = int(os.environ.get('TMDB_RATE_BURST', 40))
+MAX_QUEUE_WAIT = float(os.environ.get('TMDB_MAX_QUEUE_WAIT', 30))
+
+
+class SchedulerTimeout(requests.exceptions.Timeout):
+    """A request waited longer than MAX_QUEUE_WAIT for a rate-limit token"""
+
+
+class RateScheduler:
+    """Process-wide token bucket that hands out TMDB request slots by priority
+
+    Callers block in acquire() until a token is free and no higher-priority
+    (or earlier, same-priority) caller is waiting. pause() stops all
+    requests for a while, e.g. when TMDB answers 429 with Retry-After.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=BURST, max_wait=MAX_QUEUE_WAIT):
+        self.rate = rate
+        self.capacity = burst
+        self.max_wait = max_wait
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=CRAWL):
+        ticket = (priority, next(self._seq))
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] == ticket and now >= self.paused_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    if now >= deadline:
+                        raise SchedulerTimeout(f"Waited over {self.max_wait}s for a TMDB rate-limit slot")
+                    if self._waiting[0] != ticket:
+                        wait = deadline - now  # woken when the head of the queue leaves
+                    elif now < self.paused_until:
+                        wait = self.paused_until - now
+                    else:
+                        wait = max((1 - self.tokens) / self.rate, 0.001)
+                    self._cond.wait(min(wait, deadline - now))
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def set_rate(self, rate, burst):
+        """Change the refill rate and burst, e.g. to one worker process's share of TMDB's quota"""
+        with self._cond:
+            self.rate = rate
+            self.capacity = burst
+            self.tokens = min(self.tokens, burst)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds` (TMDB asked us to back off)"""
+        with self._cond:
+            self.throttled += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def queue_depth(self):
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            return depth
+
+    def stats(self):
+        depth = self.queue_depth()
+        with self._cond:
+            return {
+                "rate_limit": self.rate,
+                "burst": self.capacity,
+                "tokens": round(self.tokens, 2),
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+                "throttled": self.throttled,
+                "queue_depth": depth,
+            }
+
+
+def retry_after_seconds(response, default=1.0):
+    """Seconds TMDB asked us to wait, from the Retry-After header"""
+    try:
+        return max(float(response.headers.get("Retry-After", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+scheduler = RateScheduler()